@@ -0,0 +1,121 @@
+"""
+Raw BSON Passthrough Benchmark
+
+CPU time per document for the /accounts and /products list pages, from the
+reply bytes the driver receives to the JSON response body:
+
+  decoded   full documents decoded into dicts, public_doc, orjson (previous path)
+  shaped    server-shaped documents (database.json_projection) decoded into
+            dicts, orjson (current default)
+  raw       server-shaped documents kept as RawBSONDocument, bsonjs
+            (RAW_JSON_PASSTHROUGH=1; skipped without python-bsonjs)
+
+No database is needed: pages are synthesized and BSON-encoded with the shape
+MongoDB returns for each query. The $project work moved onto the server is
+not included.
+
+    python benchmarks/raw_bson.py --docs 500 --repeat 200
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+import bson
+from bson import ObjectId
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from serialization import ORJSONResponse, bsonjs, dumps, public_doc  # noqa: E402
+
+DICT_OPTIONS = CodecOptions(tz_aware=True)
+RAW_OPTIONS = CodecOptions(document_class=RawBSONDocument)
+
+
+def make_products(n: int) -> list:
+    return [{
+        "_id": ObjectId(),
+        "title": f"Product {i}",
+        "description": "A reasonably sized product description " * 3,
+        "price": 9.99 + i,
+        "product_type": "digital",
+        "status": "active",
+    } for i in range(n)]
+
+
+def make_accounts(n: int) -> list:
+    now = datetime.now(timezone.utc).replace(microsecond=123000)
+    return [{
+        "_id": ObjectId(),
+        "platform": "instagram",
+        "username": f"user{i}",
+        "followers": i * 10,
+        "last_sync": now,
+        "status": "connected",
+    } for i in range(n)]
+
+
+def shape(doc: dict) -> dict:
+    """What the json_projection() $project stage returns for a document"""
+    out = {"id": str(doc["_id"])}
+    for k, v in doc.items():
+        if k == "_id":
+            continue
+        out[k] = v.strftime("%Y-%m-%dT%H:%M:%S.") + f"{v.microsecond // 1000:03d}+00:00" if isinstance(v, datetime) else v
+    return out
+
+
+def decoded(reply: bytes, key: str) -> bytes:
+    docs = bson.decode_all(reply, DICT_OPTIONS)
+    return ORJSONResponse({key: [public_doc(it) for it in docs], "next_after": None}).body
+
+
+def shaped(reply: bytes, key: str) -> bytes:
+    docs = bson.decode_all(reply, DICT_OPTIONS)
+    return dumps({key: docs, "next_after": None})
+
+
+def raw(reply: bytes, key: str) -> bytes:
+    docs = bson.decode_all(reply, RAW_OPTIONS)
+    items = b",".join(bsonjs.dumps(doc.raw, mode=bsonjs.RELAXED).encode() for doc in docs)
+    return b'{"%s":[%s],"next_after":null}' % (key.encode(), items)
+
+
+def cpu_per_doc(fn, reply: bytes, key: str, docs: int, repeat: int) -> float:
+    """Best-of-`repeat` process CPU time per document, in microseconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.process_time()
+        fn(reply, key)
+        best = min(best, time.process_time() - started)
+    return best / docs * 1e6
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=500, help="documents per page (the endpoints cap limit at 500)")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    report = {}
+    for key, docs in (("products", make_products(args.docs)), ("accounts", make_accounts(args.docs))):
+        full_reply = b"".join(bson.encode(d) for d in docs)
+        shaped_reply = b"".join(bson.encode(shape(d)) for d in docs)
+        if bsonjs is not None:
+            assert json.loads(raw(shaped_reply, key)) == json.loads(shaped(shaped_reply, key))
+        before = cpu_per_doc(decoded, full_reply, key, args.docs, args.repeat)
+        report[key] = {"docs": args.docs, "decoded_us_per_doc": round(before, 2)}
+        after = cpu_per_doc(shaped, shaped_reply, key, args.docs, args.repeat)
+        report[key]["shaped_us_per_doc"] = round(after, 2)
+        report[key]["shaped_speedup"] = round(before / after, 1)
+        if bsonjs is not None:
+            after = cpu_per_doc(raw, shaped_reply, key, args.docs, args.repeat)
+            report[key]["raw_us_per_doc"] = round(after, 2)
+            report[key]["raw_speedup"] = round(before / after, 1)
+    if bsonjs is None:
+        report["note"] = "python-bsonjs is not installed; raw path skipped"
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,88 @@
+"""
+Serialization Benchmark
+
+Compares encoding a 10k-document /products or /accounts page the old way
+(rebuild dicts with str(_id), jsonable_encoder, then JSONResponse) against
+serialization.ORJSONResponse with public_doc. No database is needed; the
+documents are synthesized with the same shape the endpoints read.
+
+    python benchmarks/serialization.py --docs 10000 --repeat 20
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from serialization import ORJSONResponse, public_doc  # noqa: E402
+
+
+def make_products(n: int) -> list:
+    return [{
+        "_id": ObjectId(),
+        "title": f"Product {i}",
+        "description": "A reasonably sized product description " * 3,
+        "price": 9.99 + i,
+        "product_type": "digital",
+        "status": "active",
+    } for i in range(n)]
+
+
+def make_accounts(n: int) -> list:
+    now = datetime.now(timezone.utc)
+    return [{
+        "_id": ObjectId(),
+        "platform": "instagram",
+        "username": f"user{i}",
+        "followers": i * 10,
+        "last_sync": now,
+        "status": "connected",
+    } for i in range(n)]
+
+
+def legacy(docs: list, key: str) -> bytes:
+    items = []
+    for it in docs:
+        it = dict(it)
+        it["id"] = str(it.pop("_id"))
+        items.append(it)
+    return JSONResponse(jsonable_encoder({key: items, "next_after": None})).body
+
+
+def fast(docs: list, key: str) -> bytes:
+    return ORJSONResponse({key: [public_doc(dict(it)) for it in docs], "next_after": None}).body
+
+
+def bench(fn, docs: list, key: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(docs, key)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    report = {}
+    for key, docs in (("products", make_products(args.docs)), ("accounts", make_accounts(args.docs))):
+        before = bench(legacy, docs, key, args.repeat)
+        after = bench(fast, docs, key, args.repeat)
+        report[key] = {
+            "docs": args.docs,
+            "jsonable_encoder_ms": round(before * 1000, 2),
+            "orjson_ms": round(after * 1000, 2),
+            "speedup": round(before / after, 1),
+        }
+    print(json.dumps(report, indent=2))
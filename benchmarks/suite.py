@@ -0,0 +1,317 @@
+"""
+Load-test Suite
+
+Runs a weighted mix of realistic traffic against the whole FastAPI app and
+reports per-endpoint latency percentiles and throughput as JSON.
+
+Each virtual user signs up, is moved to the --plan tier (ultra_pro by
+default, so /upload and /upload/batch measure the insert path rather than
+daily-limit 429s) and links a social account, then loops over: login, /me,
+/uploads/stats, /upload and /upload/batch bursts, product
+create/list/update/delete, order creation and /accounts listing.
+
+The plan change is written straight to the database, which the suite can only
+reach when it shares it with the app: --mode inprocess, or --db env. With
+--mode uvicorn --db mongomock or --url against a mongomock server, users stay
+on the free plan and the report says so.
+
+/accounts is listed only with --db env: its json_projection() formats
+last_sync with $dateToString %L, which mongomock does not implement.
+
+Modes:
+  --mode inprocess  drive the ASGI app directly through httpx (default)
+  --mode uvicorn    start `uvicorn` in a subprocess and drive it over HTTP
+  --url URL         drive an already running server
+
+Database:
+  --db mongomock    in-memory stand-in (mongomock + mongomock-motor), default
+  --db env          use DATABASE_URL / DATABASE_NAME, e.g. a local mongod
+
+Compare two commits:
+  python benchmarks/suite.py --output before.json     # on the old commit
+  python benchmarks/suite.py --compare before.json    # on the new commit
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import secrets
+import socket
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+import httpx
+
+# Every virtual user shares one client IP, so lift the API rate limits unless set explicitly
+os.environ.setdefault("RATE_LIMIT_PER_MINUTE", "1000000000")
+os.environ.setdefault("RATE_LIMIT_IP_PER_MINUTE", "1000000000")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# (weight, scenario name)
+MIX = [
+    (30, "me"),
+    (10, "stats"),
+    (10, "login"),
+    (10, "upload"),
+    (5, "upload_batch"),
+    (15, "list_products"),
+    (10, "product_crud"),
+    (10, "order"),
+    (5, "list_accounts"),
+]
+
+# Scenarios the in-memory stand-in cannot serve
+MONGOMOCK_UNSUPPORTED = {"list_accounts"}
+
+
+def install_mongomock():
+    """Point database.db / database.async_db at in-memory stand-ins before main is imported"""
+    # mongomock cannot return RawBSONDocument
+    os.environ["RAW_JSON_PASSTHROUGH"] = "0"
+    import mongomock
+    from mongomock_motor import AsyncMongoMockClient
+
+    import database
+    database.db = mongomock.MongoClient(tz_aware=True)["bench"]
+    database.async_db = AsyncMongoMockClient(tz_aware=True)["bench"]
+
+
+def load_app(db_mode: str):
+    if db_mode == "mongomock":
+        install_mongomock()
+    import main
+    return main.app
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.errors = defaultdict(int)
+
+    async def call(self, client: httpx.AsyncClient, label: str, method: str, path: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            r = await client.request(method, path, **kwargs)
+        except httpx.HTTPError:
+            self.errors[label] += 1
+            return None
+        self.latencies[label].append(time.perf_counter() - started)
+        self.statuses[label][r.status_code] += 1
+        if r.status_code >= 500:
+            self.errors[label] += 1
+        return r
+
+    def report(self, elapsed: float) -> dict:
+        endpoints = {}
+        for label in sorted(set(self.latencies) | set(self.errors)):
+            samples = sorted(self.latencies[label])
+
+            def pct(p):
+                return round(samples[min(len(samples) - 1, int(p * len(samples)))] * 1000, 2) if samples else None
+
+            endpoints[label] = {
+                "requests": len(samples),
+                "errors": self.errors[label],
+                "statuses": {str(k): v for k, v in sorted(self.statuses[label].items())},
+                "req_per_s": round(len(samples) / elapsed, 1),
+                "p50_ms": pct(0.50),
+                "p95_ms": pct(0.95),
+                "p99_ms": pct(0.99),
+            }
+        total = sum(len(v) for v in self.latencies.values())
+        return {"total_requests": total, "req_per_s": round(total / elapsed, 1), "endpoints": endpoints}
+
+
+async def virtual_user(client: httpx.AsyncClient, rec: Recorder, deadline: float, rng: random.Random,
+                       mix: list, plan_db=None, plan: str = "free"):
+    email = f"bench-{secrets.token_hex(6)}@example.com"
+    # One device per user, so repeated logins reuse its session instead of
+    # evicting the token in use once SESSION_MAX_PER_USER is reached
+    device = {"X-Device-Id": secrets.token_hex(8)}
+    r = await rec.call(client, "POST /auth/signup", "POST", "/auth/signup", headers=device,
+                       json={"name": "Bench", "email": email, "password": "bench-pw"})
+    if r is None or r.status_code != 200:
+        return
+    if plan_db is not None and plan != "free":
+        # No endpoint changes plans; log in again so no session or signed token
+        # carries the free plan
+        await plan_db["user"].update_one({"email": email}, {"$set": {"plan": plan}})
+        r = await rec.call(client, "POST /auth/login", "POST", "/auth/login", headers=device,
+                           json={"email": email, "password": "bench-pw"})
+        if r is None or r.status_code != 200:
+            return
+    headers = {"Authorization": f"Bearer {r.json()['token']}"}
+    await rec.call(client, "POST /accounts", "POST", "/accounts", headers=headers,
+                   json={"platform": "instagram", "username": email.split("@")[0]})
+    product_ids = []
+    weights = [w for w, _ in mix]
+    names = [n for _, n in mix]
+
+    while time.perf_counter() < deadline:
+        scenario = rng.choices(names, weights)[0]
+        if scenario == "me":
+            await rec.call(client, "GET /me", "GET", "/me", headers=headers)
+        elif scenario == "stats":
+            await rec.call(client, "GET /uploads/stats", "GET", "/uploads/stats", headers=headers)
+        elif scenario == "login":
+            await rec.call(client, "POST /auth/login", "POST", "/auth/login", headers=device,
+                           json={"email": email, "password": "bench-pw"})
+        elif scenario == "upload":
+            for _ in range(rng.randint(1, 5)):
+                await rec.call(client, "POST /upload", "POST", "/upload", headers=headers,
+                               json={"media_type": "image", "caption": "bench", "platforms": ["x"]})
+        elif scenario == "upload_batch":
+            items = [{"media_type": "text", "platforms": ["x"]} for _ in range(rng.randint(2, 10))]
+            await rec.call(client, "POST /upload/batch", "POST", "/upload/batch", headers=headers, json={"items": items})
+        elif scenario == "list_products":
+            await rec.call(client, "GET /products", "GET", "/products", headers=headers)
+        elif scenario == "product_crud":
+            body = {"title": "Bench product", "price": 9.5, "product_type": "digital"}
+            r = await rec.call(client, "POST /products", "POST", "/products", headers=headers, json=body)
+            if r is not None and r.status_code == 200:
+                product_ids.append(r.json()["id"])
+            if len(product_ids) > 5:
+                pid = product_ids.pop(0)
+                await rec.call(client, "PUT /products/{id}", "PUT", f"/products/{pid}", headers=headers,
+                               json={**body, "price": 10.5})
+                await rec.call(client, "DELETE /products/{id}", "DELETE", f"/products/{pid}", headers=headers)
+        elif scenario == "order" and product_ids:
+            await rec.call(client, "POST /orders", "POST", "/orders", headers=headers,
+                           json={"product_id": rng.choice(product_ids), "buyer_email": "buyer@example.com"})
+        elif scenario == "list_accounts":
+            await rec.call(client, "GET /accounts", "GET", "/accounts", headers=headers)
+
+
+async def run(client: httpx.AsyncClient, users: int, duration: float, seed: int,
+              mix: list = MIX, plan_db=None, plan: str = "free") -> dict:
+    rec = Recorder()
+    deadline = time.perf_counter() + duration
+    started = time.perf_counter()
+    await asyncio.gather(*(virtual_user(client, rec, deadline, random.Random(seed + i), mix, plan_db, plan)
+                           for i in range(users)))
+    return rec.report(time.perf_counter() - started)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for(url: str, timeout: float = 20.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url + "/", timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise SystemExit(f"Server at {url} did not start")
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(before: dict, after: dict) -> dict:
+    diff = {}
+    for label, new in after["endpoints"].items():
+        old = before["endpoints"].get(label)
+        if not old:
+            continue
+        diff[label] = {
+            k: f"{old[k]} -> {new[k]}"
+            for k in ("p50_ms", "p95_ms", "p99_ms", "req_per_s")
+        }
+    return diff
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn"], default="inprocess")
+    parser.add_argument("--db", choices=["mongomock", "env"], default="mongomock")
+    parser.add_argument("--url", help="benchmark an already running server instead")
+    parser.add_argument("--users", type=int, default=50, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--plan", default="ultra_pro", help="plan the virtual users are moved to after signup")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--compare", help="previous JSON report to diff against")
+    parser.add_argument("--serve", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        # Child process for --mode uvicorn: the stand-in must be installed in the server process
+        import uvicorn
+        uvicorn.run(load_app(args.db), host="127.0.0.1", port=args.serve, log_level="warning")
+        return
+
+    server = None
+    mix = MIX
+    if args.db == "mongomock" and not args.url:
+        mix = [(w, n) for w, n in MIX if n not in MONGOMOCK_UNSUPPORTED]
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    if args.url:
+        client_kwargs = {"base_url": args.url}
+        target = args.url
+    elif args.mode == "uvicorn":
+        port = _free_port()
+        target = f"http://127.0.0.1:{port}"
+        server = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", str(port), "--db", args.db], cwd=ROOT)
+        _wait_for(target)
+        client_kwargs = {"base_url": target}
+    else:
+        client_kwargs = {"base_url": "http://bench", "transport": httpx.ASGITransport(app=load_app(args.db))}
+        target = "inprocess"
+
+    # The app's database, when this process can reach it
+    plan_db = None
+    if target == "inprocess" or args.db == "env":
+        import database
+        plan_db = database.async_db
+    plan = args.plan if plan_db is not None else "free"
+    if plan != args.plan:
+        print(f"warning: cannot reach the server's database; users stay on the free plan", file=sys.stderr)
+
+    async def go():
+        async with httpx.AsyncClient(limits=limits, timeout=30.0, **client_kwargs) as client:
+            return await run(client, args.users, args.duration, args.seed, mix, plan_db, plan)
+
+    try:
+        result = asyncio.run(go())
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    report = {
+        "commit": _git_commit(),
+        "target": target,
+        "db": "external" if args.url else args.db,
+        "users": args.users,
+        "plan": plan,
+        "duration_s": args.duration,
+        **result,
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            report["compare"] = compare(json.load(f), report)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
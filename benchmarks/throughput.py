@@ -0,0 +1,71 @@
+"""
+Throughput Benchmark
+
+Closed-loop load generator for a running server. Signs up a throwaway user,
+then keeps `--concurrency` clients hitting an authenticated endpoint for
+`--duration` seconds and prints requests/second as JSON.
+
+Compare the sync and async data layers by running the server from each
+commit with the same worker settings, e.g.:
+
+    uvicorn main:app --port 8000 &
+    python benchmarks/throughput.py --url http://127.0.0.1:8000 --concurrency 200
+"""
+
+import argparse
+import asyncio
+import json
+import secrets
+import time
+
+import httpx
+
+
+async def _signup(client: httpx.AsyncClient) -> str:
+    email = f"bench-{secrets.token_hex(6)}@example.com"
+    r = await client.post("/auth/signup", json={"name": "bench", "email": email, "password": "bench"})
+    r.raise_for_status()
+    return r.json()["token"]
+
+
+async def run(url: str, path: str, concurrency: int, duration: float) -> dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30.0) as client:
+        headers = {"Authorization": f"Bearer {await _signup(client)}"}
+        ok = errors = 0
+        deadline = time.perf_counter() + duration
+
+        async def worker():
+            nonlocal ok, errors
+            while time.perf_counter() < deadline:
+                try:
+                    r = await client.get(path, headers=headers)
+                    if r.status_code < 400:
+                        ok += 1
+                    else:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "path": path,
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 2),
+        "requests": ok,
+        "errors": errors,
+        "req_per_s": round(ok / elapsed, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--path", default="/me")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=15.0)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.url, args.path, args.concurrency, args.duration)), indent=2))
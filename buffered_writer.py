@@ -0,0 +1,142 @@
+"""
+Buffered Writer
+
+Write-behind ingestion for high-volume, append-only collections (analytics
+events). Documents are queued in memory and a background thread writes them
+with insert_many once `max_batch` documents are waiting or `flush_interval`
+seconds have passed, whichever comes first.
+
+When the queue is full, submit() blocks for at most `put_timeout` seconds
+(backpressure) and then drops the event and counts it.
+"""
+
+import atexit
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Optional
+
+from bson import ObjectId
+from bson.errors import InvalidDocument
+from pymongo.errors import BulkWriteError
+
+import database
+
+logger = logging.getLogger(__name__)
+
+
+class BufferedWriter:
+    def __init__(self, collection_name: str, max_batch: int = 500, flush_interval: float = 1.0,
+                 max_queue: int = 10000, put_timeout: float = 0.05, on_flush: Optional[Callable] = None):
+        self.collection_name = collection_name
+        self.on_flush = on_flush  # called with the documents written by each flush
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.submitted = 0
+        self.dropped = 0
+        self.flushed = 0
+        self.failed = 0
+        self.flushes = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stopping = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, doc: dict) -> Optional[str]:
+        """Queue a document; returns its id, or None if it was dropped"""
+        self._ensure_started()
+        doc = dict(doc)
+        doc.setdefault("_id", ObjectId())
+        try:
+            self._queue.put(doc, timeout=self.put_timeout)
+        except queue.Full:
+            self.dropped += 1
+            return None
+        self.submitted += 1
+        return str(doc["_id"])
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"buffered-writer-{self.collection_name}", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _next_batch(self) -> list:
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or (self._stopping.is_set() and self._queue.empty()):
+                break
+            try:
+                batch.append(self._queue.get(timeout=min(remaining, 0.1)))
+            except queue.Empty:
+                continue
+        return batch
+
+    def _write(self, batch: list):
+        written = batch
+        try:
+            database.create_documents(self.collection_name, batch, ordered=False)
+        except BulkWriteError as e:
+            failed = {err["index"] for err in e.details.get("writeErrors", [])}
+            written = [doc for i, doc in enumerate(batch) if i not in failed]
+        except InvalidDocument:
+            # One unencodable event must not sink the rest of its batch
+            written = self._write_each(batch)
+        except Exception:
+            # Not just PyMongoError: e.g. a missing database must fail the batch,
+            # not kill the writer thread
+            written = []
+            logger.exception("Failed to flush %d documents to %s", len(batch), self.collection_name)
+        self.flushed += len(written)
+        self.failed += len(batch) - len(written)
+        self.flushes += 1
+        if written and self.on_flush is not None:
+            try:
+                self.on_flush(written)
+            except Exception:
+                logger.exception("on_flush hook failed for %s", self.collection_name)
+
+    def _write_each(self, batch: list) -> list:
+        written = []
+        for doc in batch:
+            try:
+                database.create_documents(self.collection_name, [doc])
+            except BulkWriteError as e:
+                # Already written by the batch attempt before it failed
+                if all(err.get("code") == 11000 for err in e.details.get("writeErrors", [])):
+                    written.append(doc)
+            except Exception:
+                logger.exception("Dropping unwritable document %s for %s", doc.get("_id"), self.collection_name)
+            else:
+                written.append(doc)
+        return written
+
+    def _run(self):
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                self._write(batch)
+
+    def close(self, timeout: float = 10.0):
+        """Flush everything still queued and stop the background thread"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {
+            "collection": self.collection_name,
+            "queued": self._queue.qsize(),
+            "submitted": self.submitted,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "flushes": self.flushes,
+        }
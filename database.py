@@ -5,51 +5,314 @@ MongoDB helper functions ready to use in your backend code.
 Import and use these functions in your API endpoints for database operations.
 """
 
-from pymongo import MongoClient
+import logging
+import sys
+from pymongo import MongoClient, IndexModel, ASCENDING
+from pymongo.errors import BulkWriteError, OperationFailure
+from motor.motor_asyncio import AsyncIOMotorClient
 from datetime import datetime, timezone
 import os
 from dotenv import load_dotenv
-from typing import Union
+from typing import Iterable, List, Union
 from pydantic import BaseModel
+from bson import ObjectId
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+
+from monitoring import pool_stats, async_pool_stats, command_timer
 
 # Load environment variables from .env file
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 _client = None
 db = None
+_async_client = None
+async_db = None
 
 database_url = os.getenv("DATABASE_URL")
 database_name = os.getenv("DATABASE_NAME")
 
+def _client_options() -> dict:
+    """MongoClient options from MONGO_* environment variables; unset ones keep driver defaults"""
+    options = {}
+    int_options = {
+        "MONGO_MAX_POOL_SIZE": "maxPoolSize",
+        "MONGO_MIN_POOL_SIZE": "minPoolSize",
+        "MONGO_MAX_IDLE_TIME_MS": "maxIdleTimeMS",
+        "MONGO_WAIT_QUEUE_TIMEOUT_MS": "waitQueueTimeoutMS",
+        "MONGO_SERVER_SELECTION_TIMEOUT_MS": "serverSelectionTimeoutMS",
+        "MONGO_CONNECT_TIMEOUT_MS": "connectTimeoutMS",
+        "MONGO_SOCKET_TIMEOUT_MS": "socketTimeoutMS",
+    }
+    for env_name, option in int_options.items():
+        if os.getenv(env_name):
+            options[option] = int(os.getenv(env_name))
+    if os.getenv("MONGO_COMPRESSORS"):
+        # e.g. "zstd,snappy"; needs the zstandard / python-snappy packages installed
+        options["compressors"] = os.getenv("MONGO_COMPRESSORS")
+    if os.getenv("MONGO_READ_PREFERENCE"):
+        options["readPreference"] = os.getenv("MONGO_READ_PREFERENCE")
+    return options
+
 if database_url and database_name:
-    _client = MongoClient(database_url)
+    client_options = _client_options()
+    _client = MongoClient(database_url, event_listeners=[pool_stats, command_timer], **client_options)
     db = _client[database_name]
+    _async_client = AsyncIOMotorClient(database_url, event_listeners=[async_pool_stats, command_timer], **client_options)
+    async_db = _async_client[database_name]
 
-# Helper functions for common database operations
-def create_document(collection_name: str, data: Union[BaseModel, dict]):
-    """Insert a single document with timestamp"""
-    if db is None:
-        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
-
+def _prepare_document(data: Union[BaseModel, dict], now: datetime = None) -> dict:
     # Convert Pydantic model to dict if needed
     if isinstance(data, BaseModel):
         data_dict = data.model_dump()
     else:
         data_dict = data.copy()
 
-    data_dict['created_at'] = datetime.now(timezone.utc)
-    data_dict['updated_at'] = datetime.now(timezone.utc)
+    now = now or datetime.now(timezone.utc)
+    data_dict['created_at'] = now
+    data_dict['updated_at'] = now
+    return data_dict
+
+def _prepare_documents(items: Iterable[Union[BaseModel, dict]]) -> List[dict]:
+    # One timestamp per batch; _id assigned up front so ids are known even on partial failure
+    now = datetime.now(timezone.utc)
+    docs = [_prepare_document(item, now) for item in items]
+    for doc in docs:
+        doc.setdefault('_id', ObjectId())
+    return docs
+
+def _offset_write_errors(error: BulkWriteError, offset: int) -> list:
+    write_errors = error.details.get('writeErrors', [])
+    for write_error in write_errors:
+        write_error['index'] += offset
+    return write_errors
+
+# Helper functions for common database operations
+def create_document(collection_name: str, data: Union[BaseModel, dict]):
+    """Insert a single document with timestamp"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
 
-    result = db[collection_name].insert_one(data_dict)
+    result = db[collection_name].insert_one(_prepare_document(data))
     return str(result.inserted_id)
 
-def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None):
-    """Get documents from collection"""
+def create_documents(collection_name: str, items: Iterable[Union[BaseModel, dict]],
+                     ordered: bool = True, chunk_size: int = 1000) -> List[str]:
+    """Bulk insert documents with timestamps; returns their ids in input order.
+
+    Inserts `chunk_size` documents per insert_many (the driver further splits each
+    call at the server's message size limit). With ordered=False every document is
+    attempted; failures raise BulkWriteError whose writeErrors index into `items`
+    and whose nInserted counts the documents actually written. With ordered=True
+    nothing after the first error (including later chunks) is attempted.
+    """
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    docs = _prepare_documents(items)
+    write_errors = []
+    inserted = 0
+    for offset in range(0, len(docs), chunk_size):
+        chunk = docs[offset:offset + chunk_size]
+        try:
+            db[collection_name].insert_many(chunk, ordered=ordered)
+            inserted += len(chunk)
+        except BulkWriteError as e:
+            # Ordered inserts stop at the first error, so count what the server reports
+            inserted += e.details.get('nInserted', 0)
+            write_errors.extend(_offset_write_errors(e, offset))
+            if ordered:
+                break
+    if write_errors:
+        raise BulkWriteError({'writeErrors': write_errors, 'nInserted': inserted})
+    return [str(doc['_id']) for doc in docs]
+
+def update_document(collection_name: str, filter_dict: dict, update_data: dict):
+    """Set fields on the first matching document and bump updated_at"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    update = {**update_data, 'updated_at': datetime.now(timezone.utc)}
+    return db[collection_name].update_one(filter_dict, {'$set': update}).modified_count
+
+def delete_document(collection_name: str, filter_dict: dict):
+    """Delete the first matching document"""
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
-    
-    cursor = db[collection_name].find(filter_dict or {})
+
+    return db[collection_name].delete_one(filter_dict).deleted_count
+
+def _find(collection, filter_dict: dict = None, limit: int = None, after=None, projection: dict = None):
+    query = dict(filter_dict or {})
+    if after is not None:
+        # Keyset pagination: resume strictly after the last _id the caller saw
+        query["_id"] = {"$gt": ObjectId(after)}
+    cursor = collection.find(query, projection)
+    if after is not None or limit:
+        cursor = cursor.sort("_id", ASCENDING)
     if limit:
         cursor = cursor.limit(limit)
-    
-    return list(cursor)
+    return cursor
+
+def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None,
+                  after=None, projection: dict = None):
+    """Get documents from collection, optionally one keyset page (sorted by _id) at a time"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    return list(_find(db[collection_name], filter_dict, limit, after, projection))
+
+def iter_documents(collection_name: str, filter_dict: dict = None, projection: dict = None,
+                   sort: list = None, batch_size: int = 500):
+    """Yield documents one at a time, fetching `batch_size` per round trip"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    cursor = db[collection_name].find(filter_dict or {}, projection, batch_size=batch_size)
+    if sort:
+        cursor = cursor.sort(sort)
+    with cursor:
+        yield from cursor
+
+# Async variants for use inside `async def` endpoints (Motor, no threadpool hop)
+async def create_document_async(collection_name: str, data: Union[BaseModel, dict]):
+    """Insert a single document with timestamp"""
+    if async_db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    result = await async_db[collection_name].insert_one(_prepare_document(data))
+    return str(result.inserted_id)
+
+async def create_documents_async(collection_name: str, items: Iterable[Union[BaseModel, dict]],
+                                 ordered: bool = True, chunk_size: int = 1000) -> List[str]:
+    """Bulk insert documents with timestamps; returns their ids in input order (see create_documents)"""
+    if async_db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    docs = _prepare_documents(items)
+    write_errors = []
+    inserted = 0
+    for offset in range(0, len(docs), chunk_size):
+        chunk = docs[offset:offset + chunk_size]
+        try:
+            await async_db[collection_name].insert_many(chunk, ordered=ordered)
+            inserted += len(chunk)
+        except BulkWriteError as e:
+            # Ordered inserts stop at the first error, so count what the server reports
+            inserted += e.details.get('nInserted', 0)
+            write_errors.extend(_offset_write_errors(e, offset))
+            if ordered:
+                break
+    if write_errors:
+        raise BulkWriteError({'writeErrors': write_errors, 'nInserted': inserted})
+    return [str(doc['_id']) for doc in docs]
+
+async def get_documents_async(collection_name: str, filter_dict: dict = None, limit: int = None,
+                              after=None, projection: dict = None):
+    """Get documents from collection, optionally one keyset page (sorted by _id) at a time"""
+    if async_db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    return await _find(async_db[collection_name], filter_dict, limit, after, projection).to_list(None)
+
+def json_projection(fields: Iterable[str], dates: Iterable[str] = (), defaults: dict = None) -> dict:
+    """$project stage body that shapes documents into their JSON form on the server:
+    `_id` becomes the string `id` and date fields become ISO 8601 strings. Fields in
+    `defaults` are always present, falling back to the given value when missing or null."""
+    shape = {"_id": 0, "id": {"$toString": "$_id"}}
+    for field in fields:
+        shape[field] = 1
+    for field, default in (defaults or {}).items():
+        shape[field] = {"$ifNull": [f"${field}", default]}
+    for field in dates:
+        shape[field] = {"$dateToString": {"date": f"${field}", "format": "%Y-%m-%dT%H:%M:%S.%L+00:00"}}
+    return shape
+
+async def aggregate_page_async(collection_name: str, filter_dict: dict = None, limit: int = 100,
+                               after=None, shape: dict = None, raw: bool = False) -> list:
+    """Keyset page (sorted by _id) shaped server-side by a json_projection().
+
+    With raw=True documents come back as RawBSONDocument, so the driver never
+    decodes them into Python dicts.
+    """
+    if async_db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    query = dict(filter_dict or {})
+    if after is not None:
+        query["_id"] = {"$gt": ObjectId(after)}
+    collection = async_db[collection_name]
+    if raw:
+        collection = collection.with_options(codec_options=CodecOptions(document_class=RawBSONDocument))
+    pipeline = [{"$match": query}, {"$sort": {"_id": ASCENDING}}, {"$limit": limit}]
+    if shape:
+        pipeline.append({"$project": shape})
+    return await collection.aggregate(pipeline).to_list(None)
+
+async def aiter_documents(collection_name: str, filter_dict: dict = None, projection: dict = None,
+                          sort: list = None, batch_size: int = 500):
+    """Async-iterate documents one at a time, fetching `batch_size` per round trip"""
+    if async_db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    cursor = async_db[collection_name].find(filter_dict or {}, projection, batch_size=batch_size)
+    if sort:
+        cursor = cursor.sort(sort)
+    try:
+        async for doc in cursor:
+            yield doc
+    finally:
+        await cursor.close()
+
+# Index management (registry lives in schemas.INDEXES)
+def _index_models(specs: list) -> list:
+    return [IndexModel(spec["keys"], **{k: v for k, v in spec.items() if k != "keys"}) for spec in specs]
+
+async def ensure_indexes_async(indexes: dict = None):
+    """Create any missing indexes; existing identical indexes are a no-op"""
+    if async_db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+    if indexes is None:
+        from schemas import INDEXES as indexes
+
+    for collection_name, specs in indexes.items():
+        for model in _index_models(specs):
+            try:
+                await async_db[collection_name].create_indexes([model])
+            except OperationFailure as e:
+                # e.g. an index with the same name but different options, or duplicate keys
+                logger.warning("Could not create index %s on %s: %s", model.document["name"], collection_name, e)
+
+def diff_indexes(indexes: dict = None) -> dict:
+    """Compare the registry with the live database: {collection: {"missing": [...], "extra": [...]}}"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+    if indexes is None:
+        from schemas import INDEXES as indexes
+
+    report = {}
+    existing_collections = set(db.list_collection_names())
+    for collection_name in sorted(set(indexes) | existing_collections):
+        expected = {m.document["name"] for m in _index_models(indexes.get(collection_name, []))}
+        existing = set()
+        if collection_name in existing_collections:
+            existing = set(db[collection_name].index_information()) - {"_id_"}
+        report[collection_name] = {"missing": sorted(expected - existing), "extra": sorted(existing - expected)}
+    return report
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] != ["indexes"]:
+        print("Usage: python database.py indexes")
+        sys.exit(2)
+    drift = False
+    for name, diff in diff_indexes().items():
+        for label in ("missing", "extra"):
+            for index_name in diff[label]:
+                drift = True
+                print(f"{name}: {label} {index_name}")
+    if not drift:
+        print("Indexes match schemas.INDEXES")
+    sys.exit(1 if drift else 0)
@@ -1,25 +1,29 @@
 import os
+import json
+import math
 import hashlib
 import secrets
 from datetime import datetime, timedelta, timezone
-from typing import List, Optional
+from typing import Any, List, Optional
 
-from fastapi import FastAPI, HTTPException, Header, Depends
+from fastapi import FastAPI, HTTPException, Header, Depends, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, ValidationError, field_validator
 from bson import ObjectId
+from pymongo import ReadPreference, ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 
-from database import db, create_document, get_documents
+from database import async_db, create_document_async, create_documents_async, aiter_documents, ensure_indexes_async, aggregate_page_async, json_projection
+from session_cache import session_cache, rejected_tokens, as_utc
+from streaming import stream_documents
+from serialization import ORJSONResponse, RAW_JSON_PASSTHROUGH, page_json
+from monitoring import pool_stats, async_pool_stats, InstrumentationMiddleware, render_metrics
+from passwords import DUMMY_HASH, password_hasher, HasherBusy, hash_queue_wait, hash_compute
+from tokens import SESSION_MODE, issue_token, verify_token, revocation_list
+from sessions import SESSION_TTL, SESSION_MAX_PER_USER, device_fingerprint, session_renewals
+from ratelimit import TokenBucketTable, SlidingWindowCounter, RateLimitMiddleware
 
-app = FastAPI(title="SocialHub Pro Edition (FastAPI)")
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+app = FastAPI(title="SocialHub Pro Edition (FastAPI)", default_response_class=ORJSONResponse)
 
 # -----------------
 # Utility & Auth
@@ -34,15 +38,34 @@ class LoginBody(BaseModel):
     email: str
     password: str
 
+def _check_platform(key: str) -> str:
+    if key not in PLATFORM_INDEX:
+        raise ValueError(f"Unknown platform '{key}'")
+    return key
+
 class LinkAccountBody(BaseModel):
     platform: str
     username: str
 
+    @field_validator("platform")
+    @classmethod
+    def known_platform(cls, v: str) -> str:
+        return _check_platform(v)
+
 class UploadBody(BaseModel):
     media_type: str  # video | image | text
     caption: Optional[str] = None
     platforms: List[str]
 
+    @field_validator("platforms")
+    @classmethod
+    def known_platforms(cls, v: List[str]) -> List[str]:
+        return [_check_platform(p) for p in v]
+
+class UploadBatchBody(BaseModel):
+    # Items are validated one by one so a bad entry fails alone, not the batch
+    items: List[Any] = Field(..., min_length=1, max_length=100)
+
 class ProductBody(BaseModel):
     title: str
     description: Optional[str] = None
@@ -119,95 +142,332 @@ PLATFORMS = [
     {"key": "stackoverflow", "name": "Stack Overflow", "url": "https://stackoverflow.com"},
 ]
 
-
-def hash_password(pw: str) -> str:
-    return hashlib.sha256(pw.encode()).hexdigest()
-
-
-def create_session(user_id: str) -> str:
+# Static, so index it by key and encode the /platforms response once at import
+PLATFORM_INDEX = {p["key"]: p for p in PLATFORMS}
+PLATFORMS_BODY = json.dumps({"platforms": PLATFORMS}, separators=(",", ":")).encode()
+PLATFORMS_ETAG = '"%s"' % hashlib.sha256(PLATFORMS_BODY).hexdigest()[:32]
+PLATFORMS_HEADERS = {"ETag": PLATFORMS_ETAG, "Cache-Control": "public, max-age=3600"}
+
+
+async def create_session(user_id: str, plan: str = "free", fingerprint: Optional[str] = None) -> str:
+    now = datetime.now(timezone.utc)
+    expires_at = now + SESSION_TTL
+    if SESSION_MODE == "signed":
+        return issue_token(user_id, plan, expires_at)
+    if fingerprint:
+        # Logging in again from the same device hands back its live session
+        existing = await async_db["session"].find_one_and_update(
+            {"user_id": user_id, "fingerprint": fingerprint, "expires_at": {"$gt": now}},
+            {"$set": {"expires_at": expires_at, "last_seen_at": now}},
+            projection={"token": 1},
+            sort=[("last_seen_at", -1)],
+        )
+        if existing:
+            return existing["token"]
     token = secrets.token_urlsafe(32)
-    db["session"].insert_one({
+    await async_db["session"].insert_one({
         "token": token,
         "user_id": user_id,
-        "created_at": datetime.now(timezone.utc),
-        "expires_at": datetime.now(timezone.utc) + timedelta(days=7),
+        "fingerprint": fingerprint,
+        "created_at": now,
+        "last_seen_at": now,
+        "expires_at": expires_at,
     })
+    await evict_excess_sessions(user_id)
     return token
 
 
-def get_user_from_token(authorization: Optional[str] = Header(None)):
+async def evict_excess_sessions(user_id: str):
+    """Keep only the SESSION_MAX_PER_USER most recently used sessions of a user.
+
+    Other workers drop an evicted token from their session cache within
+    SESSION_CACHE_REVALIDATE seconds, not immediately.
+    """
+    cursor = async_db["session"].find({"user_id": user_id}, {"token": 1}).sort("last_seen_at", -1).skip(SESSION_MAX_PER_USER)
+    stale = [doc["token"] async for doc in cursor]
+    if not stale:
+        return
+    await async_db["session"].delete_many({"token": {"$in": stale}})
+    for token in stale:
+        session_cache.invalidate_token(token)
+        session_renewals.discard(token)
+        rejected_tokens.add(token)
+
+
+def request_fingerprint(request: Request) -> Optional[str]:
+    return device_fingerprint(request.headers.get("x-device-id"))
+
+
+def get_bearer_token(authorization: Optional[str] = Header(None)) -> str:
     if not authorization:
         raise HTTPException(status_code=401, detail="Missing Authorization header")
     parts = authorization.split()
     if len(parts) != 2 or parts[0].lower() != "bearer":
         raise HTTPException(status_code=401, detail="Invalid Authorization header")
-    token = parts[1]
-    sess = db["session"].find_one({"token": token})
+    return parts[1]
+
+
+# Auth lookups always read the primary. A session created moments ago may not have
+# reached a secondary yet (MONGO_READ_PREFERENCE), and a miss there is negatively cached.
+auth_db = async_db.client.get_database(async_db.name, read_preference=ReadPreference.PRIMARY) if async_db is not None else None
+
+
+async def get_user_from_token(token: str = Depends(get_bearer_token)):
+    if SESSION_MODE == "signed":
+        return await get_user_from_signed_token(token)
+    cached = session_cache.get(token)
+    if cached:
+        # Another worker may have deleted the session (logout, per-user cap) since it was cached
+        if session_cache.due_for_revalidation(token) and not await auth_db["session"].find_one({"token": token}, {"_id": 1}):
+            session_cache.invalidate_token(token)
+            rejected_tokens.add(token)
+            raise HTTPException(status_code=401, detail="Invalid token")
+        session_renewals.touch(token, cached[0])
+        return cached[1]
+    if token in rejected_tokens:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    sess = await auth_db["session"].find_one({"token": token})
     if not sess:
+        rejected_tokens.add(token)
         raise HTTPException(status_code=401, detail="Invalid token")
-    if sess.get("expires_at") and sess["expires_at"] < datetime.now(timezone.utc):
+    if sess.get("expires_at") and as_utc(sess["expires_at"]) < datetime.now(timezone.utc):
+        rejected_tokens.add(token)
         raise HTTPException(status_code=401, detail="Session expired")
-    user = db["user"].find_one({"_id": ObjectId(sess["user_id"])})
+    user = await auth_db["user"].find_one({"_id": ObjectId(sess["user_id"])})
+    if not user:
+        rejected_tokens.add(token)
+        raise HTTPException(status_code=401, detail="User not found")
+    session_renewals.touch(token, sess)
+    session_cache.put(token, sess, user)
+    return user
+
+
+async def get_user_from_signed_token(token: str):
+    claims = verify_token(token)
+    if not claims:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if await revocation_list.is_revoked(async_db, claims["jti"]):
+        raise HTTPException(status_code=401, detail="Token revoked")
+    cached = session_cache.get(token)
+    if cached:
+        return cached[1]
+    if token in rejected_tokens:
+        raise HTTPException(status_code=401, detail="User not found")
+    user = await auth_db["user"].find_one({"_id": ObjectId(claims["sub"])})
     if not user:
+        rejected_tokens.add(token)
         raise HTTPException(status_code=401, detail="User not found")
+    sess = {"user_id": claims["sub"], "expires_at": datetime.fromtimestamp(claims["exp"], tz=timezone.utc)}
+    session_cache.put(token, sess, user)
     return user
 
 
+# -----------------
+# Rate limiting
+# -----------------
+
+# Request budgets scale with the plan tiers in PLATFORM_LIMITS; unlimited plans
+# get twice the largest finite tier.
+RATE_LIMIT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", 120))  # free plan
+RATE_LIMIT_IP_PER_MINUTE = float(os.getenv("RATE_LIMIT_IP_PER_MINUTE", 600))
+
+def _plan_bucket(plan_limit: Optional[int]) -> tuple:
+    top_tier = max(v for v in PLATFORM_LIMITS.values() if v is not None)
+    factor = (plan_limit if plan_limit is not None else 2 * top_tier) / PLATFORM_LIMITS["free"]
+    per_minute = RATE_LIMIT_PER_MINUTE * factor
+    return per_minute / 60.0, per_minute / 4  # (tokens per second, burst)
+
+PLAN_BUCKETS = {plan: _plan_bucket(limit) for plan, limit in PLATFORM_LIMITS.items()}
+
+def rate_limit_identity(scope) -> Optional[tuple]:
+    """Resolve (user key, rate, burst) from memory only: signed claims or the session cache"""
+    authorization = next((v for k, v in scope["headers"] if k == b"authorization"), None)
+    if not authorization:
+        return None
+    parts = authorization.decode("latin-1").split()
+    if len(parts) != 2 or parts[0].lower() != "bearer":
+        return None
+    token = parts[1]
+    user_key, plan = None, "free"
+    if SESSION_MODE == "signed":
+        claims = verify_token(token)
+        if claims:
+            user_key, plan = claims["sub"], claims.get("plan", "free")
+    else:
+        cached = session_cache.peek(token)
+        if cached:
+            user_key, plan = str(cached[1]["_id"]), cached[1].get("plan", "free")
+    # Unresolved tokens get the free-tier budget, keyed by a fixed-size digest of the
+    # (client-controlled, arbitrarily long) token
+    rate, burst = PLAN_BUCKETS.get(plan, PLAN_BUCKETS["free"])
+    return user_key or f"token:{hashlib.sha256(token.encode('latin-1')).hexdigest()[:32]}", rate, burst
+
+rate_limit_buckets = TokenBucketTable(max_keys=int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000)))
+
+# Failed logins over a sliding window; once over a limit, /auth/login answers 429
+# without looking the user up or hashing anything. The strict limit is per
+# (email, client IP), so guessing someone's password from one address cannot lock
+# them out everywhere else; the email-only ceiling is far higher and only caps
+# guessing spread across many addresses.
+LOGIN_FAILURE_WINDOW = float(os.getenv("LOGIN_FAILURE_WINDOW", 900))
+LOGIN_MAX_FAILURES_PER_EMAIL_IP = int(os.getenv("LOGIN_MAX_FAILURES_PER_EMAIL_IP", 5))
+LOGIN_MAX_FAILURES_PER_EMAIL = int(os.getenv("LOGIN_MAX_FAILURES_PER_EMAIL", 100))
+LOGIN_MAX_FAILURES_PER_IP = int(os.getenv("LOGIN_MAX_FAILURES_PER_IP", 50))
+
+login_failures = SlidingWindowCounter(LOGIN_FAILURE_WINDOW)
+
+# Last added runs first: instrumentation, then CORS (so 429s carry CORS headers), then rate limiting
+app.add_middleware(
+    RateLimitMiddleware,
+    table=rate_limit_buckets,
+    identify=rate_limit_identity,
+    ip_rate=RATE_LIMIT_IP_PER_MINUTE / 60.0,
+    ip_burst=RATE_LIMIT_IP_PER_MINUTE / 4,
+    exempt_paths=("/", "/metrics"),
+)
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["Server-Timing"],
+)
+app.add_middleware(InstrumentationMiddleware)
+
+
+@app.on_event("startup")
+async def bootstrap_indexes():
+    if async_db is not None and os.getenv("ENSURE_INDEXES", "1") == "1":
+        await ensure_indexes_async()
+
+@app.on_event("startup")
+async def start_session_renewals():
+    if SESSION_MODE == "db" and async_db is not None:
+        session_renewals.start(async_db)
+
+@app.on_event("shutdown")
+async def shutdown_password_hasher():
+    password_hasher.shutdown()
+
+@app.on_event("shutdown")
+async def flush_session_renewals():
+    if SESSION_MODE == "db" and async_db is not None:
+        await session_renewals.stop(async_db)
+
+@app.exception_handler(HasherBusy)
+async def hasher_busy(request, exc):
+    return ORJSONResponse({"detail": "Too many login attempts in progress, retry shortly"}, status_code=503, headers={"Retry-After": "1"})
+
+
 @app.get("/")
-def root():
+async def root():
     return {"message": "SocialHub Pro Edition backend running"}
 
 @app.get("/platforms")
-def get_platforms():
-    return {"platforms": PLATFORMS}
+async def get_platforms(if_none_match: Optional[str] = Header(None)):
+    # If-None-Match uses weak comparison, so W/"..." matches the strong tag too
+    if if_none_match and {PLATFORMS_ETAG, "*"} & {t.strip().removeprefix("W/") for t in if_none_match.split(",")}:
+        return Response(status_code=304, headers=PLATFORMS_HEADERS)
+    return Response(content=PLATFORMS_BODY, media_type="application/json", headers=PLATFORMS_HEADERS)
 
 # ---------------
 # Auth
 # ---------------
 
 @app.post("/auth/signup")
-def signup(body: SignupBody):
-    existing = db["user"].find_one({"email": body.email})
+async def signup(body: SignupBody, request: Request):
+    existing = await async_db["user"].find_one({"email": body.email})
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
-    user_id = create_document("user", {
-        "name": body.name,
-        "email": body.email,
-        "password_hash": hash_password(body.password),
-        "plan": "free",
-        "avatar_url": None,
-    })
-    token = create_session(user_id)
+    try:
+        user_id = await create_document_async("user", {
+            "name": body.name,
+            "email": body.email,
+            "password_hash": await password_hasher.hash(body.password),
+            "plan": "free",
+            "avatar_url": None,
+        })
+    except DuplicateKeyError:
+        # Lost a race with a concurrent signup, or the check above read a lagging secondary
+        raise HTTPException(status_code=400, detail="Email already registered")
+    token = await create_session(user_id, fingerprint=request_fingerprint(request))
     return {"token": token, "user": {"id": user_id, "name": body.name, "email": body.email, "plan": "free"}}
 
 @app.post("/auth/login")
-def login(body: LoginBody):
-    user = db["user"].find_one({"email": body.email})
-    if not user or user.get("password_hash") != hash_password(body.password):
+async def login(body: LoginBody, request: Request):
+    email = body.email.lower()
+    ip = request.client.host if request.client else "unknown"
+    email_ip_key, email_key, ip_key = f"email-ip:{email}|{ip}", f"email:{email}", f"ip:{ip}"
+    retry_after = (login_failures.check(email_ip_key, LOGIN_MAX_FAILURES_PER_EMAIL_IP)
+                   or login_failures.check(email_key, LOGIN_MAX_FAILURES_PER_EMAIL)
+                   or login_failures.check(ip_key, LOGIN_MAX_FAILURES_PER_IP))
+    if retry_after:
+        raise HTTPException(status_code=429, detail="Too many failed login attempts",
+                            headers={"Retry-After": str(math.ceil(retry_after))})
+    user = await auth_db["user"].find_one({"email": body.email})
+    ok, needs_rehash = await password_hasher.verify(body.password, user.get("password_hash") if user else DUMMY_HASH)
+    ok = ok and user is not None
+    if not ok:
+        login_failures.add(email_ip_key)
+        login_failures.add(email_key)
+        login_failures.add(ip_key)
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    token = create_session(str(user["_id"]))
+    login_failures.reset(email_ip_key)
+    if needs_rehash:
+        # Upgrade legacy SHA-256 (or outdated scrypt parameters) on successful login
+        await async_db["user"].update_one({"_id": user["_id"]}, {"$set": {
+            "password_hash": await password_hasher.hash(body.password),
+            "updated_at": datetime.now(timezone.utc),
+        }})
+    token = await create_session(str(user["_id"]), user.get("plan", "free"), request_fingerprint(request))
     return {"token": token, "user": {"id": str(user["_id"]), "name": user["name"], "email": user["email"], "plan": user.get("plan", "free")}}
 
+@app.post("/auth/logout")
+async def logout(token: str = Depends(get_bearer_token), user=Depends(get_user_from_token)):
+    if SESSION_MODE == "signed":
+        await revocation_list.revoke(async_db, verify_token(token))
+    else:
+        await async_db["session"].delete_one({"token": token})
+        session_renewals.discard(token)
+    session_cache.invalidate_token(token)
+    rejected_tokens.add(token)
+    return {"ok": True}
+
 @app.get("/me")
-def me(user=Depends(get_user_from_token)):
+async def me(user=Depends(get_user_from_token)):
     return {"id": str(user["_id"]), "name": user["name"], "email": user["email"], "plan": user.get("plan", "free")}
 
 # ---------------
 # Social Accounts
 # ---------------
 
+ACCOUNT_JSON = json_projection(["platform", "username", "followers", "status"], dates=["last_sync"])
+
+async def get_json_page(collection_name: str, key: str, filter_dict: dict, limit: int, after: Optional[str], shape: dict) -> Response:
+    """Keyset page shaped into JSON form by MongoDB; see serialization.page_json"""
+    if after is not None and not ObjectId.is_valid(after):
+        raise HTTPException(status_code=400, detail="Invalid 'after' cursor")
+    items = await aggregate_page_async(collection_name, filter_dict, limit=limit + 1, after=after,
+                                       shape=shape, raw=RAW_JSON_PASSTHROUGH)
+    next_after = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_after = items[-1]["id"]
+    return Response(content=page_json(key, items, next_after), media_type="application/json")
+
 @app.get("/accounts")
-def list_accounts(user=Depends(get_user_from_token)):
-    items = list(db["socialaccount"].find({"user_id": str(user["_id"])}))
-    for it in items:
-        it["id"] = str(it["_id"])  # expose id
-        del it["_id"]
-    return {"accounts": items}
+async def list_accounts(
+    limit: int = Query(100, ge=1, le=500),
+    after: Optional[str] = None,
+    user=Depends(get_user_from_token),
+):
+    return await get_json_page("socialaccount", "accounts", {"user_id": str(user["_id"])}, limit, after, ACCOUNT_JSON)
 
 @app.post("/accounts")
-def link_account(body: LinkAccountBody, user=Depends(get_user_from_token)):
+async def link_account(body: LinkAccountBody, user=Depends(get_user_from_token)):
     # Simulate OAuth linking by storing username + platform
-    acc_id = create_document("socialaccount", {
+    acc_id = await create_document_async("socialaccount", {
         "user_id": str(user["_id"]),
         "platform": body.platform,
         "username": body.username,
@@ -222,59 +482,165 @@ def link_account(body: LinkAccountBody, user=Depends(get_user_from_token)):
 # Uploads & Limits
 # ---------------
 
-def get_daily_count(user_id: str) -> int:
-    start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-    end = start + timedelta(days=1)
-    return db["uploadlog"].count_documents({"user_id": user_id, "created_at": {"$gte": start, "$lt": end}})
+def _daily_counter_key(user_id: str, now: datetime) -> str:
+    return f"{user_id}:{now.strftime('%Y-%m-%d')}"
+
+async def get_daily_count(user_id: str) -> int:
+    now = datetime.now(timezone.utc)
+    counter = await async_db["uploadcounter"].find_one({"_id": _daily_counter_key(user_id, now)}, {"count": 1})
+    return counter["count"] if counter else 0
+
+async def reserve_daily_quota(user_id: str, amount: int, limit: Optional[int]) -> Optional[str]:
+    """Atomically add `amount` to today's counter if it stays within `limit`.
+
+    Returns the key of the counter charged, to hand back to release_daily_quota,
+    or None when the reservation would exceed the limit.
+    """
+    if limit is not None and amount > limit:
+        return None
+    now = datetime.now(timezone.utc)
+    day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    key = _daily_counter_key(user_id, now)
+    query = {"_id": key}
+    if limit is not None:
+        query["count"] = {"$lte": limit - amount}
+    update = {
+        "$inc": {"count": amount},
+        "$setOnInsert": {"user_id": user_id, "day": day, "expires_at": day + timedelta(days=2)},
+    }
+    counters = async_db["uploadcounter"]
+    try:
+        counter = await counters.find_one_and_update(query, update, upsert=True, return_document=ReturnDocument.AFTER)
+    except DuplicateKeyError:
+        # Either today's counter is already over the limit (so the upsert tried
+        # to insert a duplicate _id) or a concurrent request created it first.
+        counter = await counters.find_one_and_update(query, update, return_document=ReturnDocument.AFTER)
+    return key if counter else None
+
+async def release_daily_quota(counter_key: str, amount: int):
+    """Hand back part of a reservation; the key pins it to the day it was charged"""
+    await async_db["uploadcounter"].update_one({"_id": counter_key}, {"$inc": {"count": -amount}})
 
 @app.get("/uploads/stats")
-def uploads_stats(user=Depends(get_user_from_token)):
+async def uploads_stats(user=Depends(get_user_from_token)):
     plan = user.get("plan", "free")
     limit = PLATFORM_LIMITS.get(plan)
-    used = get_daily_count(str(user["_id"]))
+    used = await get_daily_count(str(user["_id"]))
     return {"plan": plan, "limit": limit, "used": used}
 
 @app.post("/upload")
-def upload(body: UploadBody, user=Depends(get_user_from_token)):
+async def upload(body: UploadBody, user=Depends(get_user_from_token)):
     plan = user.get("plan", "free")
     limit = PLATFORM_LIMITS.get(plan)
-    used = get_daily_count(str(user["_id"]))
+    user_id = str(user["_id"])
     to_add = len(body.platforms)
-    if limit is not None and used + to_add > limit:
+    counter_key = await reserve_daily_quota(user_id, to_add, limit)
+    if counter_key is None:
+        used = await get_daily_count(user_id)
         raise HTTPException(status_code=429, detail=f"Daily limit exceeded. {used}/{limit} used.")
     # Simulate queuing a job per platform
-    log_id = create_document("uploadlog", {
-        "user_id": str(user["_id"]),
-        "media_type": body.media_type,
-        "caption": body.caption,
-        "platforms": body.platforms,
-        "status": "queued",
-        "error": None,
-    })
+    try:
+        log_id = await create_document_async("uploadlog", {
+            "user_id": user_id,
+            "media_type": body.media_type,
+            "caption": body.caption,
+            "platforms": body.platforms,
+            "status": "queued",
+            "error": None,
+        })
+    except Exception:
+        await release_daily_quota(counter_key, to_add)
+        raise
     return {"status": "queued", "log_id": log_id}
 
+@app.post("/upload/batch")
+async def upload_batch(body: UploadBatchBody, user=Depends(get_user_from_token)):
+    plan = user.get("plan", "free")
+    limit = PLATFORM_LIMITS.get(plan)
+    user_id = str(user["_id"])
+    results = [None] * len(body.items)
+
+    valid = []
+    for i, item in enumerate(body.items):
+        try:
+            valid.append((i, UploadBody.model_validate(item)))
+        except ValidationError as e:
+            errors = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" if err["loc"] else err["msg"] for err in e.errors())
+            results[i] = {"index": i, "status": "rejected", "error": errors}
+
+    # Accept items in order while they fit in what is left of today's quota,
+    # then reserve the combined platform count in a single atomic update.
+    remaining = None if limit is None else max(limit - await get_daily_count(user_id), 0)
+    accepted, to_add = [], 0
+    for i, item in valid:
+        if remaining is not None and to_add + len(item.platforms) > remaining:
+            results[i] = {"index": i, "status": "rejected", "error": "Daily limit exceeded"}
+            continue
+        accepted.append((i, item))
+        to_add += len(item.platforms)
+    counter_key = await reserve_daily_quota(user_id, to_add, limit) if accepted else None
+    if accepted and counter_key is None:
+        for i, _ in accepted:
+            results[i] = {"index": i, "status": "rejected", "error": "Daily limit exceeded"}
+        accepted = []
+
+    if accepted:
+        docs = [{
+            "_id": ObjectId(),  # assigned here so ids are known even if some inserts fail
+            "user_id": user_id,
+            "media_type": item.media_type,
+            "caption": item.caption,
+            "platforms": item.platforms,
+            "status": "queued",
+            "error": None,
+        } for _, item in accepted]
+        failed = {}
+        try:
+            await create_documents_async("uploadlog", docs, ordered=False)
+        except BulkWriteError as e:
+            failed = {err["index"]: err.get("errmsg", "Write failed") for err in e.details.get("writeErrors", [])}
+        except Exception:
+            # Nothing is known to be written; hand the whole reservation back
+            await release_daily_quota(counter_key, to_add)
+            raise
+        refund = 0
+        for pos, ((i, item), doc) in enumerate(zip(accepted, docs)):
+            if pos in failed:
+                refund += len(item.platforms)
+                results[i] = {"index": i, "status": "rejected", "error": failed[pos]}
+            else:
+                results[i] = {"index": i, "status": "queued", "log_id": str(doc["_id"])}
+        if refund:
+            await release_daily_quota(counter_key, refund)
+
+    queued = sum(1 for r in results if r["status"] == "queued")
+    return {"queued": queued, "rejected": len(results) - queued, "results": results}
+
+@app.get("/uploads/export")
+async def export_uploads(format: str = Query("ndjson", pattern="^(ndjson|json)$"), user=Depends(get_user_from_token)):
+    docs = aiter_documents("uploadlog", {"user_id": str(user["_id"])}, sort=[("created_at", 1)])
+    return stream_documents(docs, format, key="uploads", filename=f"uploads.{format}")
+
 # ---------------
 # Products & Orders
 # ---------------
 
+# Every product carries all five fields; older documents may lack price or status
+PRODUCT_JSON = json_projection([], defaults={
+    "title": None, "description": None, "price": 0, "product_type": None, "status": "active",
+})
+
 @app.get("/products")
-def list_products(user=Depends(get_user_from_token)):
-    items = list(db["product"].find({"user_id": str(user["_id"])}))
-    results = []
-    for it in items:
-        results.append({
-            "id": str(it["_id"]),
-            "title": it.get("title"),
-            "description": it.get("description"),
-            "price": it.get("price", 0),
-            "product_type": it.get("product_type"),
-            "status": it.get("status", "active"),
-        })
-    return {"products": results}
+async def list_products(
+    limit: int = Query(100, ge=1, le=500),
+    after: Optional[str] = None,
+    user=Depends(get_user_from_token),
+):
+    return await get_json_page("product", "products", {"user_id": str(user["_id"])}, limit, after, PRODUCT_JSON)
 
 @app.post("/products")
-def create_product(body: ProductBody, user=Depends(get_user_from_token)):
-    pid = create_document("product", {
+async def create_product(body: ProductBody, user=Depends(get_user_from_token)):
+    pid = await create_document_async("product", {
         "title": body.title,
         "description": body.description,
         "price": body.price,
@@ -285,11 +651,11 @@ def create_product(body: ProductBody, user=Depends(get_user_from_token)):
     return {"id": pid}
 
 @app.put("/products/{product_id}")
-def update_product(product_id: str, body: ProductBody, user=Depends(get_user_from_token)):
-    prod = db["product"].find_one({"_id": ObjectId(product_id), "user_id": str(user["_id"])})
+async def update_product(product_id: str, body: ProductBody, user=Depends(get_user_from_token)):
+    prod = await async_db["product"].find_one({"_id": ObjectId(product_id), "user_id": str(user["_id"])})
     if not prod:
         raise HTTPException(status_code=404, detail="Product not found")
-    db["product"].update_one({"_id": ObjectId(product_id)}, {"$set": {
+    await async_db["product"].update_one({"_id": ObjectId(product_id)}, {"$set": {
         "title": body.title,
         "description": body.description,
         "price": body.price,
@@ -300,16 +666,16 @@ def update_product(product_id: str, body: ProductBody, user=Depends(get_user_fro
     return {"ok": True}
 
 @app.delete("/products/{product_id}")
-def delete_product(product_id: str, user=Depends(get_user_from_token)):
-    db["product"].delete_one({"_id": ObjectId(product_id), "user_id": str(user["_id"])})
+async def delete_product(product_id: str, user=Depends(get_user_from_token)):
+    await async_db["product"].delete_one({"_id": ObjectId(product_id), "user_id": str(user["_id"])})
     return {"ok": True}
 
 @app.post("/orders")
-def create_order(body: OrderBody, user=Depends(get_user_from_token)):
-    prod = db["product"].find_one({"_id": ObjectId(body.product_id), "user_id": str(user["_id"])})
+async def create_order(body: OrderBody, user=Depends(get_user_from_token)):
+    prod = await async_db["product"].find_one({"_id": ObjectId(body.product_id), "user_id": str(user["_id"])})
     if not prod:
         raise HTTPException(status_code=404, detail="Product not found")
-    order_id = create_document("order", {
+    order_id = await create_document_async("order", {
         "user_id": str(user["_id"]),
         "product_id": body.product_id,
         "buyer_email": body.buyer_email,
@@ -319,16 +685,21 @@ def create_order(body: OrderBody, user=Depends(get_user_from_token)):
     })
     return {"id": order_id, "status": "paid"}
 
+@app.get("/orders/export")
+async def export_orders(format: str = Query("ndjson", pattern="^(ndjson|json)$"), user=Depends(get_user_from_token)):
+    docs = aiter_documents("order", {"user_id": str(user["_id"])}, sort=[("_id", 1)])
+    return stream_documents(docs, format, key="orders", filename=f"orders.{format}")
+
 # ---------------
 # AI Edit (Ultra Pro only)
 # ---------------
 
 @app.post("/ai/edit")
-def ai_edit(body: AiEditBody, user=Depends(get_user_from_token)):
+async def ai_edit(body: AiEditBody, user=Depends(get_user_from_token)):
     if user.get("plan", "free") != "ultra_pro":
         raise HTTPException(status_code=403, detail="AI video editing is available for Ultra Pro only")
     # Simulate AI edit job
-    job_id = create_document("aijob", {
+    job_id = await create_document_async("aijob", {
         "user_id": str(user["_id"]),
         "source_url": body.source_url,
         "operations": body.operations,
@@ -341,7 +712,7 @@ def ai_edit(body: AiEditBody, user=Depends(get_user_from_token)):
 # ---------------
 
 @app.get("/test")
-def test_database():
+async def test_database():
     response = {
         "backend": "✅ Running",
         "database": "❌ Not Available",
@@ -351,13 +722,13 @@ def test_database():
         "collections": []
     }
     try:
-        if db is not None:
+        if async_db is not None:
             response["database"] = "✅ Available"
             response["database_url"] = "✅ Configured"
-            response["database_name"] = db.name if hasattr(db, 'name') else "✅ Connected"
+            response["database_name"] = async_db.name if hasattr(async_db, 'name') else "✅ Connected"
             response["connection_status"] = "Connected"
             try:
-                collections = db.list_collection_names()
+                collections = await async_db.list_collection_names()
                 response["collections"] = collections[:20]
                 response["database"] = "✅ Connected & Working"
             except Exception as e:
@@ -369,8 +740,34 @@ def test_database():
 
     response["database_url"] = "✅ Set" if os.getenv("DATABASE_URL") else "❌ Not Set"
     response["database_name"] = "✅ Set" if os.getenv("DATABASE_NAME") else "❌ Not Set"
+    response["session_cache"] = session_cache.stats()
     return response
 
+@app.get("/metrics")
+async def metrics():
+    cache = session_cache.stats()
+    renewals = session_renewals.stats()
+    return Response(render_metrics(histograms=(hash_queue_wait, hash_compute), gauges={
+        "session_cache_hits_total": cache["hits"],
+        "session_cache_misses_total": cache["misses"],
+        "session_cache_size": cache["size"],
+        "password_hash_rejected_total": password_hasher.rejected,
+        "rate_limit_buckets": len(rate_limit_buckets),
+        "rate_limit_rejected_total": rate_limit_buckets.rejected,
+        "rate_limit_evictions_total": rate_limit_buckets.evictions,
+        # Requests answered from memory that would otherwise have queried MongoDB
+        "rejected_token_cache_hits_total": rejected_tokens.hits,
+        "rejected_token_cache_size": len(rejected_tokens),
+        "login_throttled_total": login_failures.rejected,
+        "login_failure_keys": len(login_failures),
+        "session_renewals_pending": renewals["pending"],
+        "session_renewals_written_total": renewals["written"],
+    }), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/pool")
+async def pool_metrics():
+    return {"async": async_pool_stats.snapshot(), "sync": pool_stats.snapshot()}
+
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,252 @@
+"""
+Monitoring
+
+pymongo event listeners that keep live statistics about the driver
+(register them on a MongoClient via `event_listeners=[...]`), plus the
+per-request instrumentation middleware behind /metrics.
+"""
+
+import threading
+import time
+from contextvars import ContextVar
+
+from pymongo import monitoring
+from starlette.datastructures import MutableHeaders
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Connection pool gauges and counters built from CMAP events"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pools = 0
+        self.connections_created = 0
+        self.connections_closed = 0
+        self.checkouts_started = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.checkins = 0
+        self.pool_clears = 0
+
+    def _inc(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def pool_created(self, event):
+        self._inc("pools")
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._inc("pool_clears")
+
+    def pool_closed(self, event):
+        with self._lock:
+            self.pools -= 1
+
+    def connection_created(self, event):
+        self._inc("connections_created")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._inc("connections_closed")
+
+    def connection_check_out_started(self, event):
+        self._inc("checkouts_started")
+
+    def connection_check_out_failed(self, event):
+        self._inc("checkout_failures")
+
+    def connection_checked_out(self, event):
+        self._inc("checkouts")
+
+    def connection_checked_in(self, event):
+        self._inc("checkins")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "pools": self.pools,
+                "open": self.connections_created - self.connections_closed,
+                "checked_out": self.checkouts - self.checkins,
+                "waiting": self.checkouts_started - self.checkouts - self.checkout_failures,
+                "created_total": self.connections_created,
+                "closed_total": self.connections_closed,
+                "checkouts_total": self.checkouts,
+                "checkout_failures_total": self.checkout_failures,
+                "pool_clears_total": self.pool_clears,
+            }
+
+
+# One per client so sync (scripts, worker helpers) and async (API) pools are reported separately
+pool_stats = PoolStats()
+async_pool_stats = PoolStats()
+
+
+# -----------------
+# Per-request instrumentation
+# -----------------
+
+class RequestStats:
+    """DB work attributed to the current request"""
+    __slots__ = ("db_durations",)
+
+    def __init__(self):
+        # list.append is atomic, so driver threads can record concurrently
+        self.db_durations = []
+
+    @property
+    def db_commands(self) -> int:
+        return len(self.db_durations)
+
+    @property
+    def db_seconds(self) -> float:
+        return sum(self.db_durations)
+
+
+_current_request = ContextVar("current_request", default=None)
+
+
+class CommandTimer(monitoring.CommandListener):
+    """Attributes each MongoDB command's duration to the request that issued it.
+
+    Motor runs pymongo calls in executor threads with a copy of the caller's
+    context, so the ContextVar set by the middleware is visible here.
+    """
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        stats = _current_request.get()
+        if stats is not None:
+            stats.db_durations.append(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        self.succeeded(event)
+
+
+command_timer = CommandTimer()
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram keyed by a label tuple"""
+
+    def __init__(self, name: str, help: str, buckets: tuple, labels: tuple):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.labels = labels
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, label_values: tuple, value: float):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted(self._series.items())
+        for label_values, series in items:
+            labels = ",".join(f'{k}="{v}"' for k, v in zip(self.labels, label_values))
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{labels}}} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{{{labels}}} {series[-1]}")
+        return lines
+
+
+_LABELS = ("method", "route")
+request_latency = Histogram(
+    "http_request_duration_seconds", "Total request latency",
+    (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0), _LABELS)
+request_db_time = Histogram(
+    "http_request_db_seconds", "Time spent in MongoDB commands per request",
+    (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0), _LABELS)
+request_db_commands = Histogram(
+    "http_request_db_commands", "MongoDB commands issued per request",
+    (0, 1, 2, 3, 5, 8, 13, 21, 50), _LABELS)
+response_size = Histogram(
+    "http_response_size_bytes", "Response body size",
+    (100, 1000, 10000, 100000, 1000000, 10000000), _LABELS)
+HISTOGRAMS = (request_latency, request_db_time, request_db_commands, response_size)
+
+
+class InstrumentationMiddleware:
+    """ASGI middleware recording latency, DB commands/time and response size per route.
+
+    Adds a Server-Timing header (`app` and `db` durations in ms) to every response.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._route_paths = {}
+
+    def _route(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        path = self._route_paths.get(endpoint)
+        if path is None:
+            path = next((r.path for r in scope["app"].routes if getattr(r, "endpoint", None) is endpoint), "unmatched")
+            self._route_paths[endpoint] = path
+        return path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        started = time.perf_counter()
+        size = 0
+
+        async def send_with_timing(message):
+            nonlocal size
+            if message["type"] == "http.response.start":
+                app_ms = (time.perf_counter() - started) * 1000
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Server-Timing",
+                    f'app;dur={app_ms:.1f}, db;dur={stats.db_seconds * 1000:.1f};desc="{stats.db_commands} commands"',
+                )
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_request.reset(token)
+            labels = (scope["method"], self._route(scope))
+            request_latency.observe(labels, time.perf_counter() - started)
+            request_db_time.observe(labels, stats.db_seconds)
+            request_db_commands.observe(labels, stats.db_commands)
+            response_size.observe(labels, size)
+
+
+def render_metrics(gauges: dict = None, histograms: tuple = ()) -> str:
+    """Prometheus text exposition of request histograms, pool stats and extra metrics"""
+    lines = []
+    for histogram in HISTOGRAMS + tuple(histograms):
+        lines.extend(histogram.render())
+    for client, stats in (("async", async_pool_stats), ("sync", pool_stats)):
+        for key, value in stats.snapshot().items():
+            lines.append(f'mongo_pool_{key}{{client="{client}"}} {value}')
+    for name, value in (gauges or {}).items():
+        if value is not None:
+            lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
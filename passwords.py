@@ -0,0 +1,128 @@
+"""
+Password Hashing
+
+scrypt (memory-hard) password hashing executed in a dedicated process pool,
+so slow key derivation never blocks the event loop or the threadpool.
+
+At most `max_pending` derivations may be queued or running at once; callers
+beyond that wait up to `acquire_timeout` seconds and then get HasherBusy,
+which the API turns into a 503. A login storm therefore degrades into fast
+rejections instead of starving every other endpoint.
+
+Stored format: scrypt$<n>$<r>$<p>$<salt b64>$<hash b64>. Legacy unsalted
+SHA-256 hex digests are still accepted (at the cost of one scrypt derivation,
+so verification time does not depend on the stored format) and flagged for
+rehashing.
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Tuple
+
+from monitoring import Histogram
+
+SCRYPT_N = int(os.getenv("SCRYPT_N", 2 ** 14))
+SCRYPT_R = int(os.getenv("SCRYPT_R", 8))
+SCRYPT_P = int(os.getenv("SCRYPT_P", 1))
+SCRYPT_DKLEN = 32
+
+hash_queue_wait = Histogram(
+    "password_hash_queue_wait_seconds", "Time a password hash waited for a worker process",
+    (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5), ("op",))
+hash_compute = Histogram(
+    "password_hash_compute_seconds", "Time spent deriving a password hash",
+    (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0), ("op",))
+
+
+class HasherBusy(Exception):
+    """Too many password hashes are already queued"""
+
+
+def _derive(password: str, salt: bytes, n: int, r: int, p: int) -> Tuple[bytes, float]:
+    # Runs in a worker process; returns the key and how long derivation took
+    started = time.perf_counter()
+    key = hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, dklen=SCRYPT_DKLEN,
+                         maxmem=128 * n * r * p + 1024 * 1024)
+    return key, time.perf_counter() - started
+
+
+def _b64(raw: bytes) -> str:
+    return base64.b64encode(raw).decode()
+
+
+# Verified against when no account exists, so an unknown email costs the same
+# scrypt derivation as a wrong password and login timing does not reveal which
+# emails are registered. Nothing derives to an all-zero key.
+DUMMY_HASH = f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64(bytes(16))}${_b64(bytes(SCRYPT_DKLEN))}"
+
+
+class PasswordHasher:
+    def __init__(self, workers: int = 2, max_pending: int = 32, acquire_timeout: float = 2.0):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.acquire_timeout = acquire_timeout
+        self.rejected = 0
+        self._executor = None
+        self._slots = asyncio.Semaphore(max_pending)
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    async def _derive(self, op: str, password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+        queued_at = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise HasherBusy()
+        try:
+            loop = asyncio.get_running_loop()
+            key, compute = await loop.run_in_executor(self._pool(), _derive, password, salt, n, r, p)
+        finally:
+            self._slots.release()
+        hash_compute.observe((op,), compute)
+        hash_queue_wait.observe((op,), max(time.perf_counter() - queued_at - compute, 0.0))
+        return key
+
+    async def hash(self, password: str) -> str:
+        salt = secrets.token_bytes(16)
+        key = await self._derive("hash", password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+        return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(key)}"
+
+    async def verify(self, password: str, stored: str) -> Tuple[bool, bool]:
+        """Return (matches, needs_rehash)"""
+        if not stored or not stored.startswith("scrypt$"):
+            # Missing or legacy unsalted SHA-256 hash. The check itself is instant, so
+            # still run one derivation: otherwise these accounts answer faster than
+            # scrypt accounts and unknown emails, revealing which emails exist.
+            await self._derive("verify", password, bytes(16), SCRYPT_N, SCRYPT_R, SCRYPT_P)
+            if not stored:
+                return False, False
+            legacy = hashlib.sha256(password.encode()).hexdigest()
+            ok = hmac.compare_digest(legacy, stored)
+            return ok, ok
+        _, n, r, p, salt, expected = stored.split("$")
+        n, r, p = int(n), int(r), int(p)
+        key = await self._derive("verify", password, base64.b64decode(salt), n, r, p)
+        ok = hmac.compare_digest(key, base64.b64decode(expected))
+        return ok, ok and (n, r, p) != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    workers=int(os.getenv("PASSWORD_HASH_WORKERS", 2)),
+    max_pending=int(os.getenv("PASSWORD_HASH_MAX_PENDING", 32)),
+    acquire_timeout=float(os.getenv("PASSWORD_HASH_ACQUIRE_TIMEOUT", 2.0)),
+)
@@ -0,0 +1,195 @@
+"""
+Rate Limiting
+
+In-memory token buckets for API rate limiting. Buckets live in a sharded
+table (one lock per shard) so concurrent requests for different keys rarely
+contend, and idle buckets are evicted as shards are touched. The table holds
+at most `max_keys` buckets; when a shard is full its oldest bucket is
+dropped, which only resets that key to a full burst.
+
+RateLimitMiddleware checks a per-IP bucket and, when the request can be tied
+to a user, a per-user bucket sized by plan. It answers 429 before the request
+reaches any handler, so rejected traffic never costs a MongoDB query.
+
+SlidingWindowCounter counts events (e.g. failed logins) per key over a
+rolling window, using the weighted two-window approximation.
+"""
+
+import math
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+from serialization import dumps
+
+
+class _Shard:
+    __slots__ = ("lock", "buckets", "last_sweep")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}  # key -> [tokens, last refill (monotonic)]
+        self.last_sweep = time.monotonic()
+
+
+class TokenBucketTable:
+    def __init__(self, shards: int = 64, idle_seconds: float = 600.0, sweep_interval: float = 60.0,
+                 max_keys: int = 100000):
+        self.idle_seconds = idle_seconds
+        self.sweep_interval = sweep_interval
+        self.shard_capacity = max(max_keys // shards, 1)
+        self.rejected = 0
+        self.evictions = 0
+        self._shards = [_Shard() for _ in range(shards)]
+
+    def take(self, key: str, rate: float, burst: float, cost: float = 1.0) -> float:
+        """Consume `cost` tokens; returns 0 if allowed, else seconds until it would be"""
+        shard = self._shards[hash(key) % len(self._shards)]
+        now = time.monotonic()
+        with shard.lock:
+            bucket = shard.buckets.get(key)
+            if bucket is None:
+                if len(shard.buckets) >= self.shard_capacity:
+                    self._make_room(shard, now)
+                bucket = shard.buckets[key] = [burst, now]
+            else:
+                bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            if now - shard.last_sweep > self.sweep_interval:
+                self._sweep(shard, now)
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                return 0.0
+            self.rejected += 1
+            return (cost - bucket[0]) / rate
+
+    def _sweep(self, shard: _Shard, now: float):
+        # A bucket idle this long has refilled completely, so dropping it is lossless
+        idle = [k for k, (_, last) in shard.buckets.items() if now - last > self.idle_seconds]
+        for key in idle:
+            del shard.buckets[key]
+        shard.last_sweep = now
+
+    def _make_room(self, shard: _Shard, now: float):
+        self._sweep(shard, now)
+        while len(shard.buckets) >= self.shard_capacity:
+            # Dicts keep insertion order, so this is the longest-lived bucket
+            del shard.buckets[next(iter(shard.buckets))]
+            self.evictions += 1
+
+    def __len__(self) -> int:
+        return sum(len(shard.buckets) for shard in self._shards)
+
+
+class SlidingWindowCounter:
+    """Approximate per-key event counts over the last `window` seconds.
+
+    Each key keeps the counts of the current and previous fixed windows; the
+    estimate weights the previous one by how much of it still overlaps.
+    """
+
+    def __init__(self, window: float, max_keys: int = 100000):
+        self.window = window
+        self.max_keys = max_keys
+        self.rejected = 0
+        self._counts = {}  # key -> [window index, previous count, current count]
+        self._lock = threading.Lock()
+
+    def _entry(self, key: str, index: int) -> Optional[list]:
+        entry = self._counts.get(key)
+        if entry is None:
+            return None
+        if entry[0] != index:
+            entry[1] = entry[2] if entry[0] == index - 1 else 0
+            entry[2] = 0
+            entry[0] = index
+        return entry
+
+    def add(self, key: str, n: int = 1):
+        index = int(time.monotonic() // self.window)
+        with self._lock:
+            entry = self._entry(key, index)
+            if entry is None:
+                if len(self._counts) >= self.max_keys:
+                    self._evict(index)
+                entry = self._counts[key] = [index, 0, 0]
+            entry[2] += n
+
+    def check(self, key: str, limit: int) -> float:
+        """Returns 0 while the key is under `limit`, else seconds until it drops below"""
+        now = time.monotonic()
+        index = int(now // self.window)
+        fraction = now / self.window - index
+        with self._lock:
+            entry = self._entry(key, index)
+            if entry is None:
+                return 0.0
+            _, previous, current = entry
+            if previous * (1 - fraction) + current < limit:
+                return 0.0
+            self.rejected += 1
+        if current < limit:
+            # The previous window's weight fades out during this one
+            return max(1 - (limit - current) / previous - fraction, 0.0) * self.window
+        return (1 - fraction + 1 - limit / current) * self.window
+
+    def reset(self, key: str):
+        with self._lock:
+            self._counts.pop(key, None)
+
+    def _evict(self, index: int):
+        # Keys untouched for two windows count as zero; drop those first, then the oldest
+        stale = [k for k, entry in self._counts.items() if entry[0] < index - 1]
+        for key in stale:
+            del self._counts[key]
+        while len(self._counts) >= self.max_keys:
+            del self._counts[next(iter(self._counts))]
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+
+class RateLimitMiddleware:
+    """ASGI middleware enforcing per-IP and per-user token buckets.
+
+    `identify(scope)` returns (user_key, rate, burst) for the request, or None
+    when the caller cannot be identified without I/O; it must not touch the
+    database.
+    """
+
+    def __init__(self, app, table: TokenBucketTable, identify: Callable[[dict], Optional[Tuple[str, float, float]]],
+                 ip_rate: float, ip_burst: float, exempt_paths: tuple = ()):
+        self.app = app
+        self.table = table
+        self.identify = identify
+        self.ip_rate = ip_rate
+        self.ip_burst = ip_burst
+        self.exempt_paths = set(exempt_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        client = scope.get("client")
+        retry_after = self.table.take(f"ip:{client[0] if client else 'unknown'}", self.ip_rate, self.ip_burst)
+        if not retry_after:
+            identity = self.identify(scope)
+            if identity is not None:
+                user_key, rate, burst = identity
+                retry_after = self.table.take(f"user:{user_key}", rate, burst)
+        if not retry_after:
+            await self.app(scope, receive, send)
+            return
+
+        body = dumps({"detail": "Rate limit exceeded"})
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(math.ceil(retry_after)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,148 @@
+"""
+Analytics Rollups
+
+Pre-aggregated counters for the raw `page_views` and `user_activities`
+events, one document per (dimension, key, granularity, bucket), maintained
+with $inc upserts. Dashboards read a few hundred rollup documents instead of
+scanning every event.
+
+Two ways to keep them current (pick one per deployment, see ROLLUP_MODE):
+
+- ingest:  apply_rollups() runs on every batch the analytics BufferedWriter
+           flushes (wired up in schema_examples.py)
+- catchup: `python rollups.py` scans new raw events since the last
+           checkpoint stored in `rollup_checkpoints`
+
+Catch-up only reads events whose _id is older than ROLLUP_CATCHUP_LAG
+seconds. Event ids are assigned when the BufferedWriter queues an event, the
+insert lands up to a flush interval later, and ids from different processes
+within one second are unordered; the lag keeps such late arrivals from
+slipping in below a checkpoint that has already been saved.
+"""
+
+import argparse
+import os
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from pymongo import ASCENDING, UpdateOne
+
+import database
+from session_cache import as_utc
+
+ROLLUP_MODE = os.getenv("ROLLUP_MODE", "ingest")  # ingest | catchup | off
+# Must stay comfortably above the analytics writers' flush interval
+ROLLUP_CATCHUP_LAG = float(os.getenv("ROLLUP_CATCHUP_LAG", 60))
+
+# source collection -> rollup collection and the event fields counted
+ROLLUPS = {
+    "page_views": {"collection": "page_view_rollups", "dimensions": ("page_path", "user_id")},
+    "user_activities": {"collection": "user_activity_rollups", "dimensions": ("user_id", "action")},
+}
+
+GRANULARITIES = ("minute", "hour", "day")
+
+
+def bucket_start(ts: datetime, granularity: str) -> datetime:
+    ts = as_utc(ts)
+    if granularity == "minute":
+        return ts.replace(second=0, microsecond=0)
+    if granularity == "hour":
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def count_events(source: str, docs: list) -> Counter:
+    """Aggregate a batch in memory: (dimension, key, granularity, bucket) -> count"""
+    counts = Counter()
+    dimensions = ROLLUPS[source]["dimensions"]
+    for doc in docs:
+        ts = doc.get("timestamp") or doc.get("created_at")
+        if ts is None:
+            continue
+        buckets = [(g, bucket_start(ts, g)) for g in GRANULARITIES]
+        for dimension in dimensions:
+            key = doc.get(dimension)
+            if key is None:
+                continue
+            for granularity, bucket in buckets:
+                counts[(dimension, key, granularity, bucket)] += 1
+    return counts
+
+
+def apply_rollups(source: str, docs: list) -> int:
+    """Fold a batch of raw events into the rollup collection; returns rollup docs touched"""
+    counts = count_events(source, docs)
+    if not counts:
+        return 0
+    now = datetime.now(timezone.utc)
+    ops = [
+        UpdateOne(
+            {"dimension": dimension, "key": key, "granularity": granularity, "bucket": bucket},
+            {"$inc": {"count": n}, "$set": {"updated_at": now}},
+            upsert=True,
+        )
+        for (dimension, key, granularity, bucket), n in counts.items()
+    ]
+    database.db[ROLLUPS[source]["collection"]].bulk_write(ops, ordered=False)
+    return len(ops)
+
+
+def catch_up(source: str, batch_size: int = 1000, lag: float = ROLLUP_CATCHUP_LAG) -> int:
+    """Roll up raw events newer than the stored checkpoint; returns events processed.
+
+    The checkpoint is the last processed _id and advances after each batch, so
+    an interrupted run resumes where it stopped (a batch cut off mid-apply may
+    be counted twice). Events younger than `lag` seconds are left for the next
+    pass, so the checkpoint never moves past ids that may still be in flight.
+    """
+    checkpoints = database.db["rollup_checkpoints"]
+    checkpoint = checkpoints.find_one({"_id": source}) or {}
+    last_id = checkpoint.get("last_id")
+    upper = ObjectId.from_datetime(datetime.now(timezone.utc) - timedelta(seconds=lag))
+    processed = 0
+    while True:
+        query = {"_id": {"$gt": last_id, "$lt": upper} if last_id else {"$lt": upper}}
+        batch = list(database.db[source].find(query).sort("_id", ASCENDING).limit(batch_size))
+        if not batch:
+            break
+        apply_rollups(source, batch)
+        last_id = batch[-1]["_id"]
+        checkpoints.update_one(
+            {"_id": source},
+            {"$set": {"last_id": last_id, "updated_at": datetime.now(timezone.utc)}},
+            upsert=True,
+        )
+        processed += len(batch)
+    return processed
+
+
+def get_rollup_series(source: str, dimension: str, key, granularity: str,
+                      start: datetime, end: datetime) -> list:
+    """Counts per bucket in [start, end) for one dimension value, oldest first"""
+    cursor = database.db[ROLLUPS[source]["collection"]].find(
+        {"dimension": dimension, "key": key, "granularity": granularity, "bucket": {"$gte": start, "$lt": end}},
+        {"_id": 0, "bucket": 1, "count": 1},
+    ).sort("bucket", ASCENDING)
+    return list(cursor)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Roll up new analytics events since the last checkpoint")
+    parser.add_argument("sources", nargs="*", default=list(ROLLUPS), choices=list(ROLLUPS))
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--loop", type=float, metavar="SECONDS", help="keep running, sleeping between passes")
+    args = parser.parse_args()
+    if ROLLUP_MODE == "ingest":
+        # Ingest mode already counted these events; a first pass without a checkpoint would count them again
+        raise SystemExit("ROLLUP_MODE=ingest keeps rollups current already; set ROLLUP_MODE=catchup to use this command.")
+    if database.db is None:
+        raise SystemExit("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+    while True:
+        for source in args.sources:
+            print(f"{source}: rolled up {catch_up(source, args.batch_size)} events")
+        if not args.loop:
+            break
+        time.sleep(args.loop)
@@ -5,8 +5,12 @@ This file contains example schemas and patterns for typical applications.
 Copy and modify these examples for your specific needs.
 """
 
-from datetime import datetime
-from database import create_document, get_documents, update_document, delete_document
+import os
+from datetime import datetime, timezone
+from buffered_writer import BufferedWriter
+from rollups import ROLLUP_MODE, apply_rollups
+from sequences import next_id
+from database import create_document, create_documents, get_documents, update_document, delete_document
 
 # =============================================================================
 # USER MANAGEMENT SCHEMA
@@ -51,29 +55,126 @@ def create_blog_post(title: str, content: str, author_id: str, tags: list = None
         "status": "draft",
         "view_count": 0,
         "likes": 0,
-        "comments": []
+        # Comments live in the "comments" collection; the post keeps a count
+        # and a capped preview of the latest ones
+        "comment_count": 0,
+        "recent_comments": []
     }
     return create_document("posts", post_data)
 
+RECENT_COMMENTS_PREVIEW = 5
+
 def add_comment_to_post(post_id: str, author_id: str, comment_text: str):
     """Add comment to a blog post"""
     from bson import ObjectId
-    
-    comment = {
-        "id": str(ObjectId()),
+    from database import db
+
+    now = datetime.now(timezone.utc)
+    comment_id = db.comments.insert_one({
+        "post_id": post_id,
         "author_id": author_id,
         "text": comment_text,
-        "created_at": datetime.utcnow(),
-        "likes": 0
+        "likes": 0,
+        "created_at": now,
+        "updated_at": now
+    }).inserted_id
+    # Same timestamp as the comment document, so preview and collection agree
+    preview = {
+        "id": str(comment_id),
+        "author_id": author_id,
+        "text": comment_text[:280],
+        "created_at": now
     }
-    
-    # Add comment to post's comments array
-    from database import db
+
+    # Count and preview are updated together in a single atomic update
     result = db.posts.update_one(
         {"_id": ObjectId(post_id)},
-        {"$push": {"comments": comment}}
+        {
+            "$inc": {"comment_count": 1},
+            "$push": {"recent_comments": {"$each": [preview], "$slice": -RECENT_COMMENTS_PREVIEW}}
+        }
+    )
+    if result.matched_count == 0:
+        db.comments.delete_one({"_id": comment_id})
+        return False
+    return True
+
+def migrate_embedded_comments(batch_size: int = 100):
+    """One-off move of posts' legacy embedded `comments` arrays into the comments collection.
+
+    Safe to re-run: moved comments keep their old id as _id (duplicates are
+    skipped), and a post's array is only unset in the same update that adds
+    its comments to comment_count. Returns the number of posts migrated.
+    """
+    from bson import ObjectId
+    from pymongo.errors import BulkWriteError
+    from database import db
+
+    migrated = 0
+    while True:
+        posts = list(db.posts.find({"comments": {"$exists": True}}, {"comments": 1}).limit(batch_size))
+        if not posts:
+            return migrated
+        for post in posts:
+            post_id = str(post["_id"])
+            now = datetime.now(timezone.utc)
+            docs = []
+            for comment in post.get("comments") or []:
+                created_at = comment.get("created_at") or now
+                if created_at.tzinfo is None:
+                    created_at = created_at.replace(tzinfo=timezone.utc)  # legacy utcnow() values
+                old_id = comment.get("id")
+                docs.append({
+                    "_id": ObjectId(old_id) if old_id and ObjectId.is_valid(old_id) else ObjectId(),
+                    "post_id": post_id,
+                    "author_id": comment.get("author_id"),
+                    "text": comment.get("text", ""),
+                    "likes": comment.get("likes", 0),
+                    "created_at": created_at,
+                    "updated_at": now
+                })
+            if docs:
+                try:
+                    db.comments.insert_many(docs, ordered=False)
+                except BulkWriteError as e:
+                    # Only duplicates from an earlier, interrupted run are expected here
+                    if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                        raise
+            # $inc also covers comments added through add_comment_to_post before the move
+            latest = list(db.comments.find({"post_id": post_id}).sort([("created_at", -1), ("_id", -1)]).limit(RECENT_COMMENTS_PREVIEW))
+            db.posts.update_one(
+                {"_id": post["_id"], "comments": {"$exists": True}},
+                {
+                    "$inc": {"comment_count": len(docs)},
+                    "$set": {"recent_comments": [{
+                        "id": str(c["_id"]),
+                        "author_id": c.get("author_id"),
+                        "text": c.get("text", "")[:280],
+                        "created_at": c["created_at"]
+                    } for c in reversed(latest)]},
+                    "$unset": {"comments": ""}
+                }
+            )
+            migrated += 1
+
+def get_post_comments(post_id: str, limit: int = 20, before: str = None):
+    """Newest-first page of a post's comments; pass the returned next_before to get older ones"""
+    from bson import ObjectId
+    from database import db
+
+    query = {"post_id": post_id}
+    if before:
+        anchor = db.comments.find_one({"_id": ObjectId(before)}, {"created_at": 1})
+        if anchor:
+            query["$or"] = [
+                {"created_at": {"$lt": anchor["created_at"]}},
+                {"created_at": anchor["created_at"], "_id": {"$lt": anchor["_id"]}}
+            ]
+    comments = list(
+        db.comments.find(query).sort([("created_at", -1), ("_id", -1)]).limit(limit + 1)
     )
-    return result.modified_count > 0
+    next_before = str(comments[limit - 1]["_id"]) if len(comments) > limit else None
+    return {"comments": comments[:limit], "next_before": next_before}
 
 # =============================================================================
 # E-COMMERCE SCHEMA
@@ -86,7 +187,7 @@ def create_product(name: str, price: float, description: str, category: str):
         "price": price,
         "description": description,
         "category": category,
-        "sku": f"PROD-{datetime.now().strftime('%Y%m%d%H%M%S')}",
+        "sku": next_id("PROD", "product_sku"),
         "inventory": {
             "stock": 0,
             "reserved": 0,
@@ -108,7 +209,7 @@ def create_order(user_id: str, items: list, shipping_address: dict):
     
     order_data = {
         "user_id": user_id,
-        "order_number": f"ORD-{datetime.now().strftime('%Y%m%d%H%M%S')}",
+        "order_number": next_id("ORD", "order_number"),
         "items": items,
         "total_amount": total_amount,
         "shipping_address": shipping_address,
@@ -168,6 +269,26 @@ def create_task(project_id: str, title: str, description: str, assignee_id: str
     }
     return create_document("tasks", task_data)
 
+def create_tasks(project_id: str, tasks: list):
+    """Create many tasks in one round trip; tasks are dicts with title/description/assignee_id"""
+    task_docs = [{
+        "project_id": project_id,
+        "title": task["title"],
+        "description": task.get("description", ""),
+        "assignee_id": task.get("assignee_id"),
+        "status": "todo",
+        "priority": task.get("priority", "medium"),
+        "labels": [],
+        "due_date": None,
+        "time_tracking": {
+            "estimated_hours": 0,
+            "logged_hours": 0
+        },
+        "checklist": [],
+        "attachments": []
+    } for task in tasks]
+    return create_documents("tasks", task_docs, ordered=False)
+
 # =============================================================================
 # CHAT/MESSAGING SCHEMA
 # =============================================================================
@@ -235,7 +356,7 @@ def create_booking(event_id: str, user_id: str, ticket_quantity: int = 1):
         "event_id": event_id,
         "user_id": user_id,
         "ticket_quantity": ticket_quantity,
-        "booking_reference": f"BOOK-{datetime.now().strftime('%Y%m%d%H%M%S')}",
+        "booking_reference": next_id("BOOK", "booking_reference"),
         "status": "confirmed",  # pending, confirmed, cancelled
         "payment": {
             "amount": 0.0,
@@ -251,6 +372,27 @@ def create_booking(event_id: str, user_id: str, ticket_quantity: int = 1):
 # ANALYTICS/TRACKING SCHEMA
 # =============================================================================
 
+# Analytics events are written behind a buffer: one insert_many per batch instead of
+# one insert_one per event. Call activity_writer.stats() / page_view_writer.stats()
+# for flushed and dropped counts.
+_writer_options = {
+    "max_batch": int(os.getenv("ANALYTICS_BATCH_SIZE", 500)),
+    "flush_interval": float(os.getenv("ANALYTICS_FLUSH_INTERVAL", 1.0)),
+    "max_queue": int(os.getenv("ANALYTICS_QUEUE_SIZE", 10000)),
+}
+# With ROLLUP_MODE=ingest each flushed batch also updates the rollup counters (see rollups.py)
+_ingest_rollups = ROLLUP_MODE == "ingest"
+activity_writer = BufferedWriter(
+    "user_activities",
+    on_flush=(lambda docs: apply_rollups("user_activities", docs)) if _ingest_rollups else None,
+    **_writer_options,
+)
+page_view_writer = BufferedWriter(
+    "page_views",
+    on_flush=(lambda docs: apply_rollups("page_views", docs)) if _ingest_rollups else None,
+    **_writer_options,
+)
+
 def track_user_activity(user_id: str, action: str, resource_type: str, resource_id: str, metadata: dict = None):
     """Track user activity for analytics"""
     activity_data = {
@@ -264,7 +406,7 @@ def track_user_activity(user_id: str, action: str, resource_type: str, resource_
         "session_id": None,
         "timestamp": datetime.utcnow()
     }
-    return create_document("user_activities", activity_data)
+    return activity_writer.submit(activity_data)
 
 def track_page_view(page_path: str, user_id: str = None, session_id: str = None):
     """Track page views for analytics"""
@@ -284,7 +426,7 @@ def track_page_view(page_path: str, user_id: str = None, session_id: str = None)
         },
         "timestamp": datetime.utcnow()
     }
-    return create_document("page_views", pageview_data)
+    return page_view_writer.submit(pageview_data)
 
 # =============================================================================
 # NOTIFICATION SCHEMA
@@ -313,6 +455,9 @@ if __name__ == "__main__":
     # Create a user
     # user_id = create_user("John Doe", "john@example.com", "hashed_password")
     
+    # Move comments embedded in existing posts into the comments collection (run once)
+    # migrate_embedded_comments()
+
     # Create a blog post
     # post_id = create_blog_post("My First Post", "This is the content", user_id, ["tech", "python"])
     
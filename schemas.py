@@ -12,7 +12,7 @@ Model name is converted to lowercase for the collection name:
 """
 
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime
 
 class User(BaseModel):
@@ -40,8 +40,10 @@ class UploadLog(BaseModel):
     media_type: str = Field(..., description="video | image | text")
     caption: Optional[str] = Field(None)
     platforms: List[str] = Field(default_factory=list)
-    status: str = Field("queued", description="queued | posted | failed")
+    status: str = Field("queued", description="queued | processing | posted | failed")
     error: Optional[str] = Field(None)
+    results: Dict[str, str] = Field(default_factory=dict, description="Per-platform outcome: posted | failed")
+    attempts: int = Field(0, description="Times a worker has claimed this log")
 
 class Product(BaseModel):
     title: str = Field(..., description="Product title")
@@ -58,3 +60,69 @@ class Order(BaseModel):
     amount: float = Field(..., ge=0)
     currency: str = Field("USD")
     status: str = Field("paid", description="paid | pending | failed")
+
+# -----------------
+# Indexes
+# -----------------
+# Declarative index registry: collection -> list of index specs.
+# "keys" is a list of (field, direction) pairs; every other entry is passed to
+# pymongo.IndexModel as an option. Applied at startup by database.ensure_indexes_async,
+# and `python database.py indexes` reports drift against a live database.
+
+INDEXES = {
+    "user": [
+        {"keys": [("email", 1)], "unique": True},
+    ],
+    "session": [
+        {"keys": [("token", 1)], "unique": True},
+        # TTL: the server purges sessions once expires_at has passed
+        {"keys": [("expires_at", 1)], "expireAfterSeconds": 0},
+        # Session reuse per device and the per-user cap (most recently used first)
+        {"keys": [("user_id", 1), ("fingerprint", 1)]},
+        {"keys": [("user_id", 1), ("last_seen_at", -1)]},
+    ],
+    # (user_id, _id) serves both the owner filter and keyset pagination on _id
+    "socialaccount": [
+        {"keys": [("user_id", 1), ("_id", 1)]},
+    ],
+    "product": [
+        {"keys": [("user_id", 1), ("_id", 1)]},
+    ],
+    "uploadlog": [
+        {"keys": [("user_id", 1), ("created_at", 1)]},
+        # worker.py claims the oldest queued log
+        {"keys": [("status", 1), ("created_at", 1)]},
+    ],
+    "uploadcounter": [
+        {"keys": [("expires_at", 1)], "expireAfterSeconds": 0},
+    ],
+    # /orders/export streams a seller's orders in _id order
+    "order": [
+        {"keys": [("user_id", 1), ("_id", 1)]},
+    ],
+    # schema_examples.get_post_comments pages newest-first within a post
+    "comments": [
+        {"keys": [("post_id", 1), ("created_at", -1), ("_id", -1)]},
+    ],
+    # Identifiers allocated by sequences.next_id; unique indexes guarantee no duplicates
+    "products": [
+        {"keys": [("sku", 1)], "unique": True},
+    ],
+    "orders": [
+        {"keys": [("order_number", 1)], "unique": True},
+    ],
+    "bookings": [
+        {"keys": [("booking_reference", 1)], "unique": True},
+    ],
+    # rollups.py: one counter per (dimension, key, granularity, bucket)
+    "page_view_rollups": [
+        {"keys": [("dimension", 1), ("key", 1), ("granularity", 1), ("bucket", 1)], "unique": True},
+    ],
+    "user_activity_rollups": [
+        {"keys": [("dimension", 1), ("key", 1), ("granularity", 1), ("bucket", 1)], "unique": True},
+    ],
+    "revokedtoken": [
+        {"keys": [("jti", 1)], "unique": True},
+        {"keys": [("expires_at", 1)], "expireAfterSeconds": 0},
+    ],
+}
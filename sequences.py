@@ -0,0 +1,52 @@
+"""
+Sequence Allocator
+
+Collision-free, human-readable identifiers (SKUs, order numbers, booking
+references). Numbers come from the `counters` collection in blocks: one
+$inc reserves `block_size` values, which are then handed out from memory,
+so a round trip is needed only once per block.
+
+Values left in a block when the process exits are skipped, so sequences are
+unique and increasing per process but not gap-free.
+"""
+
+import os
+import threading
+
+from pymongo import ReturnDocument
+
+import database
+
+
+class SequenceAllocator:
+    def __init__(self, block_size: int = 100):
+        self.block_size = block_size
+        self._blocks = {}  # name -> [next value, last value]
+        self._lock = threading.Lock()
+
+    def _reserve(self, name: str) -> list:
+        counter = database.db["counters"].find_one_and_update(
+            {"_id": name},
+            {"$inc": {"value": self.block_size}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        last = counter["value"]
+        return [last - self.block_size + 1, last]
+
+    def next(self, name: str) -> int:
+        with self._lock:
+            block = self._blocks.get(name)
+            if block is None or block[0] > block[1]:
+                block = self._blocks[name] = self._reserve(name)
+            value = block[0]
+            block[0] += 1
+            return value
+
+
+sequences = SequenceAllocator(block_size=int(os.getenv("SEQUENCE_BLOCK_SIZE", 100)))
+
+
+def next_id(prefix: str, name: str, width: int = 8) -> str:
+    """e.g. next_id("ORD", "order_number") -> "ORD-00000042" """
+    return f"{prefix}-{sequences.next(name):0{width}d}"
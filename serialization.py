@@ -0,0 +1,81 @@
+"""
+Response Serialization
+
+orjson-backed JSON encoding shared by every endpoint. Serializes ObjectId,
+datetime (naive values are treated as UTC) and Pydantic models natively, so
+handlers can return MongoDB documents without converting fields by hand.
+
+Returning an ORJSONResponse directly skips FastAPI's jsonable_encoder. Plain
+dicts returned from handlers still go through it first, so ObjectId and
+datetime are registered there too with the same output.
+
+List endpoints read documents already shaped into their JSON form by MongoDB
+(see database.json_projection), so encoding them needs no per-field work.
+RAW_JSON_PASSTHROUGH=1 (requires python-bsonjs) instead keeps them as
+RawBSONDocument and converts BSON straight to JSON bytes; it is off by
+default because bsonjs measured slower per document than the C decoder plus
+orjson (see benchmarks/raw_bson.py).
+"""
+
+import os
+from datetime import datetime, timezone
+
+import orjson
+from bson import ObjectId
+from fastapi.encoders import ENCODERS_BY_TYPE
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import bsonjs
+except ImportError:  # optional, only used with RAW_JSON_PASSTHROUGH=1
+    bsonjs = None
+
+_OPTIONS = orjson.OPT_NAIVE_UTC
+
+RAW_JSON_PASSTHROUGH = bsonjs is not None and os.getenv("RAW_JSON_PASSTHROUGH", "0") == "1"
+
+
+def _default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _isoformat(value: datetime) -> str:
+    return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).isoformat()
+
+
+ENCODERS_BY_TYPE[ObjectId] = str
+ENCODERS_BY_TYPE[datetime] = _isoformat
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=_default, option=_OPTIONS)
+
+
+def public_doc(doc: dict) -> dict:
+    """Expose a document's `_id` as `id`; the encoder stringifies the ObjectId"""
+    doc["id"] = doc.pop("_id")
+    return doc
+
+
+class ORJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson.
+
+    Returning one of these directly from a handler also skips FastAPI's
+    jsonable_encoder pass, which is the expensive part for large lists.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def page_json(key: str, docs: list, next_after) -> bytes:
+    """Encode {key: docs, "next_after": ...}; RawBSONDocuments go through bsonjs"""
+    if docs and RAW_JSON_PASSTHROUGH and hasattr(docs[0], "raw"):
+        items = b",".join(bsonjs.dumps(doc.raw, mode=bsonjs.RELAXED).encode() for doc in docs)
+        return b'{"%s":[%s],"next_after":%s}' % (key.encode(), items, dumps(next_after))
+    return dumps({key: docs, "next_after": next_after})
@@ -0,0 +1,54 @@
+"""
+Production Launcher
+
+Runs the API under uvicorn with one worker process per CPU core (override
+with WEB_CONCURRENCY). uvloop and httptools are used when installed.
+
+    python serve.py            # production: N workers
+    python serve.py --dev      # development: single process with --reload
+"""
+
+import argparse
+import os
+
+import uvicorn
+
+
+def default_workers() -> int:
+    if os.getenv("WEB_CONCURRENCY"):
+        return int(os.getenv("WEB_CONCURRENCY"))
+    if hasattr(os, "sched_getaffinity"):
+        # Respects CPU pinning / container cpusets, unlike os.cpu_count()
+        return max(len(os.sched_getaffinity(0)), 1)
+    return os.cpu_count() or 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the SocialHub API")
+    parser.add_argument("--dev", action="store_true", help="single process with auto-reload")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", 8000)))
+    parser.add_argument("--workers", type=int, default=default_workers())
+    args = parser.parse_args()
+
+    if args.dev:
+        uvicorn.run("main:app", host=args.host, port=args.port, reload=True)
+        return
+
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop="auto",  # uvloop when available
+        http="auto",  # httptools when available
+        backlog=int(os.getenv("BACKLOG", 2048)),
+        timeout_keep_alive=int(os.getenv("KEEPALIVE_TIMEOUT", 5)),
+        timeout_graceful_shutdown=int(os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT", 30)),
+        proxy_headers=True,
+        access_log=os.getenv("ACCESS_LOG", "0") == "1",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Session Cache
+
+Bounded in-process cache for authenticated sessions.
+Maps a bearer token to its session and user documents so repeat requests
+skip the `session` and `user` lookups in MongoDB.
+
+Another API worker may delete a session (logout, per-user cap) while it is
+cached here. Cached db-mode sessions are therefore rechecked with a cheap
+existence query at most every `revalidate_seconds`, which bounds how long a
+revoked token keeps working on other workers. NegativeCache remembers
+tokens that were just rejected, so replaying a bad token is answered from
+memory too.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+
+def as_utc(value: datetime) -> datetime:
+    """Treat naive datetimes coming back from MongoDB as UTC"""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+class SessionCache:
+    """LRU cache of token -> (session, user) with TTL eviction"""
+
+    def __init__(self, max_size: int = 10000, ttl_seconds: float = 60.0, revalidate_seconds: float = 5.0):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.revalidate_seconds = revalidate_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # token -> [deadline, session, user, next revalidation]
+        self._lock = threading.Lock()
+
+    def get(self, token: str):
+        """Return (session, user) for a token, or None if absent or stale"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] <= now:
+                del self._entries[token]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def peek(self, token: str):
+        """Like get(), but without touching LRU order or hit/miss counters"""
+        entry = self._entries.get(token)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1], entry[2]
+
+    def put(self, token: str, session: dict, user: dict):
+        """Cache a session, never past the session's own expires_at"""
+        ttl = self.ttl_seconds
+        expires_at = session.get("expires_at")
+        if expires_at:
+            remaining = (as_utc(expires_at) - datetime.now(timezone.utc)).total_seconds()
+            ttl = min(ttl, remaining)
+        if ttl <= 0 or self.max_size <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._entries[token] = [now + ttl, session, user, now + self.revalidate_seconds]
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def due_for_revalidation(self, token: str) -> bool:
+        """True at most once per revalidate_seconds per token; the caller then rechecks the session"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[3] > now:
+                return False
+            entry[3] = now + self.revalidate_seconds
+            return True
+
+    def invalidate_token(self, token: str):
+        with self._lock:
+            self._entries.pop(token, None)
+
+    def invalidate_user(self, user_id: str):
+        """Drop every cached session of a user, e.g. after a plan or profile change"""
+        with self._lock:
+            stale = [t for t, (_, _, user, _) in self._entries.items() if str(user["_id"]) == user_id]
+            for token in stale:
+                del self._entries[token]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._entries)
+        lookups = self.hits + self.misses
+        return {
+            "size": size,
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+class NegativeCache:
+    """Bounded LRU set of recently rejected tokens with TTL eviction"""
+
+    def __init__(self, max_size: int = 50000, ttl_seconds: float = 300.0):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0  # lookups answered here instead of MongoDB
+        self._entries = OrderedDict()  # token -> deadline
+        self._lock = threading.Lock()
+
+    def __contains__(self, token: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            deadline = self._entries.get(token)
+            if deadline is None:
+                return False
+            if deadline <= now:
+                del self._entries[token]
+                return False
+            self.hits += 1
+            return True
+
+    def add(self, token: str):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[token] = time.monotonic() + self.ttl_seconds
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, token: str):
+        with self._lock:
+            self._entries.pop(token, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+session_cache = SessionCache(
+    max_size=int(os.getenv("SESSION_CACHE_SIZE", 10000)),
+    ttl_seconds=float(os.getenv("SESSION_CACHE_TTL", 60)),
+    revalidate_seconds=float(os.getenv("SESSION_CACHE_REVALIDATE", 5)),
+)
+
+rejected_tokens = NegativeCache(
+    max_size=int(os.getenv("REJECTED_TOKEN_CACHE_SIZE", 50000)),
+    ttl_seconds=float(os.getenv("REJECTED_TOKEN_CACHE_TTL", 300)),
+)
@@ -0,0 +1,125 @@
+"""
+Session Lifecycle
+
+Device fingerprints, per-user session caps and sliding expiry for
+database-backed sessions (SESSION_MODE=db). The cap evicts the sessions used
+least recently (last_seen_at, refreshed on reuse and on each renewal).
+
+Sliding expiry is written lazily: a request made more than
+SESSION_RENEW_INTERVAL seconds after the session was last extended queues a
+new expires_at in memory, and a background task writes all queued renewals
+with one bulk_write every SESSION_RENEW_FLUSH_INTERVAL seconds.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from session_cache import as_utc
+
+logger = logging.getLogger(__name__)
+
+SESSION_TTL = timedelta(days=float(os.getenv("SESSION_TTL_DAYS", 7)))
+SESSION_MAX_PER_USER = int(os.getenv("SESSION_MAX_PER_USER", 10))
+
+
+def device_fingerprint(device_id: Optional[str]) -> Optional[str]:
+    """Stable id for the client device from its X-Device-Id header.
+
+    There is deliberately no User-Agent fallback: different devices running the
+    same browser build would share one session, and logging out on one would
+    log out the other.
+    """
+    if not device_id:
+        return None
+    return hashlib.sha256(f"device:{device_id}".encode()).hexdigest()[:32]
+
+
+class SessionRenewals:
+    """Queue of pending expires_at extensions, flushed in batches"""
+
+    def __init__(self, ttl: timedelta = SESSION_TTL, renew_interval: float = 3600.0, flush_interval: float = 30.0):
+        self.ttl = ttl
+        self.renew_interval = timedelta(seconds=renew_interval)
+        self.flush_interval = flush_interval
+        self.queued = 0
+        self.written = 0
+        self.flushes = 0
+        self._pending = {}  # token -> new expires_at
+        self._task = None
+
+    def touch(self, token: str, session: dict):
+        """Slide a session's expiry forward if it was last extended long enough ago"""
+        expires_at = session.get("expires_at")
+        if expires_at is None:
+            return
+        renewed = datetime.now(timezone.utc) + self.ttl
+        if renewed - as_utc(expires_at) < self.renew_interval:
+            return
+        # The (possibly cached) session dict sees the new expiry at once, so
+        # later requests do not queue it again
+        session["expires_at"] = renewed
+        self._pending[token] = renewed
+        self.queued += 1
+
+    def discard(self, token: str):
+        self._pending.pop(token, None)
+
+    async def flush(self, db) -> int:
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, {}
+        now = datetime.now(timezone.utc)
+        ops = [
+            # Never move an expiry backwards; deleted sessions simply match nothing
+            UpdateOne({"token": token, "expires_at": {"$lt": expires_at}},
+                      {"$set": {"expires_at": expires_at, "last_seen_at": now}})
+            for token, expires_at in pending.items()
+        ]
+        try:
+            await db["session"].bulk_write(ops, ordered=False)
+        except PyMongoError:
+            # Cached sessions already show the new expiry, so keep the renewals for the
+            # next flush; a renewal queued since the swap is newer and wins
+            logger.exception("Failed to write %d session renewals", len(ops))
+            for token, expires_at in pending.items():
+                self._pending.setdefault(token, expires_at)
+            return 0
+        self.written += len(ops)
+        self.flushes += 1
+        return len(ops)
+
+    async def _run(self, db):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush(db)
+
+    def start(self, db):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(db))
+
+    async def stop(self, db):
+        """Cancel the flush loop and write whatever is still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush(db)
+
+    def stats(self) -> dict:
+        return {"pending": len(self._pending), "queued": self.queued, "written": self.written, "flushes": self.flushes}
+
+
+session_renewals = SessionRenewals(
+    renew_interval=float(os.getenv("SESSION_RENEW_INTERVAL", 3600)),
+    flush_interval=float(os.getenv("SESSION_RENEW_FLUSH_INTERVAL", 30)),
+)
@@ -0,0 +1,38 @@
+"""
+Streaming Responses
+
+Helpers that turn a document iterator into an incrementally written HTTP
+body, so exports run in constant memory regardless of result size.
+"""
+
+from typing import AsyncIterator, Callable, Optional
+
+from fastapi.responses import StreamingResponse
+
+from serialization import dumps, public_doc
+
+
+async def _ndjson(docs: AsyncIterator[dict], transform: Callable):
+    async for doc in docs:
+        yield dumps(transform(doc)) + b"\n"
+
+
+async def _json_array(docs: AsyncIterator[dict], transform: Callable, key: Optional[str]):
+    yield b'{"%s":[' % key.encode() if key else b"["
+    first = True
+    async for doc in docs:
+        yield (b"" if first else b",") + dumps(transform(doc))
+        first = False
+    yield b"]}" if key else b"]"
+
+
+def stream_documents(docs: AsyncIterator[dict], format: str = "ndjson", key: Optional[str] = None,
+                     transform: Callable = public_doc, filename: Optional[str] = None) -> StreamingResponse:
+    """Stream documents as NDJSON (one object per line) or as a JSON array.
+
+    With format="json" and a `key`, the array is wrapped as {"<key>": [...]}.
+    """
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'} if filename else None
+    if format == "ndjson":
+        return StreamingResponse(_ndjson(docs, transform), media_type="application/x-ndjson", headers=headers)
+    return StreamingResponse(_json_array(docs, transform, key), media_type="application/json", headers=headers)
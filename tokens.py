@@ -0,0 +1,102 @@
+"""
+Signed Session Tokens
+
+Stateless alternative to the `session` collection. A token carries the
+user id, plan and expiry, signed with HMAC-SHA256, so it can be verified
+without a database round trip. Revoked tokens are tracked by their `jti`
+in the `revokedtoken` collection and mirrored in memory.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+SESSION_MODE = os.getenv("SESSION_MODE", "db")  # db | signed
+SESSION_SECRET = os.getenv("SESSION_SECRET", "")
+
+if SESSION_MODE == "signed" and not SESSION_SECRET:
+    raise RuntimeError("SESSION_MODE=signed requires SESSION_SECRET to be set.")
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(payload: str) -> str:
+    return _b64encode(hmac.new(SESSION_SECRET.encode(), payload.encode(), hashlib.sha256).digest())
+
+
+def issue_token(user_id: str, plan: str, expires_at: datetime) -> str:
+    """Create a signed token for a user"""
+    claims = {
+        "sub": user_id,
+        "plan": plan,
+        "exp": int(expires_at.timestamp()),
+        "jti": secrets.token_urlsafe(12),
+    }
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    return f"{payload}.{_sign(payload)}"
+
+
+def verify_token(token: str) -> Optional[dict]:
+    """Return the claims of a valid, unexpired token, otherwise None"""
+    payload, _, signature = token.partition(".")
+    # compare_digest raises TypeError on non-ASCII str; real tokens are base64url anyway
+    if not payload or not signature or not token.isascii():
+        return None
+    if not hmac.compare_digest(signature, _sign(payload)):
+        return None
+    try:
+        claims = json.loads(_b64decode(payload))
+    except ValueError:
+        return None
+    if claims.get("exp", 0) < time.time():
+        return None
+    return claims
+
+
+class RevocationList:
+    """In-memory copy of revoked token ids, refreshed from MongoDB periodically"""
+
+    def __init__(self, refresh_seconds: float = 30.0):
+        self.refresh_seconds = refresh_seconds
+        self._revoked = set()
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def load(self, db):
+        now = datetime.now(timezone.utc)
+        cursor = db["revokedtoken"].find({"expires_at": {"$gt": now}}, {"jti": 1})
+        self._revoked = {doc["jti"] async for doc in cursor}
+        self._loaded_at = time.monotonic()
+
+    async def is_revoked(self, db, jti: str) -> bool:
+        if time.monotonic() - self._loaded_at > self.refresh_seconds:
+            # Single-flight refresh so a burst of requests triggers one query
+            async with self._lock:
+                if time.monotonic() - self._loaded_at > self.refresh_seconds:
+                    await self.load(db)
+        return jti in self._revoked
+
+    async def revoke(self, db, claims: dict):
+        expires_at = datetime.fromtimestamp(claims["exp"], tz=timezone.utc)
+        await db["revokedtoken"].update_one(
+            {"jti": claims["jti"]},
+            {"$setOnInsert": {"jti": claims["jti"], "user_id": claims["sub"], "expires_at": expires_at}},
+            upsert=True,
+        )
+        self._revoked.add(claims["jti"])
+
+
+revocation_list = RevocationList(refresh_seconds=float(os.getenv("REVOCATION_REFRESH_SECONDS", 30)))
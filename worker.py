@@ -0,0 +1,291 @@
+"""
+Upload Dispatch Worker
+
+Claims queued `uploadlog` documents and posts them to every platform listed
+in the log, then records the outcome as "posted" or "failed".
+
+A claim holds a lease: every write made for it is conditioned on the log
+still carrying that claim, so a worker whose lease expired cannot overwrite
+the result of the worker that re-claimed the log. Platforms already recorded
+as posted are skipped on a re-claim, and a log claimed more than
+`max_attempts` times is marked failed instead of being retried forever.
+
+Run alongside the API:
+
+    python worker.py --jobs 16 --per-platform 4
+
+Platform adapters are pluggable through `register_adapter`; platforms without
+a registered adapter use `FakeAdapter`, which only simulates latency and
+failures so the pipeline can be exercised locally.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import defaultdict, deque
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+
+import database
+from session_cache import as_utc
+
+logger = logging.getLogger("worker")
+
+
+# -----------------
+# Platform adapters
+# -----------------
+
+class FakeAdapter:
+    """Stand-in adapter: sleeps for a random latency and fails at a given rate"""
+
+    def __init__(self, min_latency: float = 0.05, max_latency: float = 0.3, failure_rate: float = 0.0):
+        self.min_latency = min_latency
+        self.max_latency = max_latency
+        self.failure_rate = failure_rate
+
+    async def post(self, log: dict, platform: str):
+        await asyncio.sleep(random.uniform(self.min_latency, self.max_latency))
+        if random.random() < self.failure_rate:
+            raise RuntimeError(f"simulated {platform} failure")
+
+
+ADAPTERS = {}
+default_adapter = FakeAdapter(failure_rate=float(os.getenv("FAKE_ADAPTER_FAILURE_RATE", 0)))
+
+
+def register_adapter(platform: str, adapter):
+    """Register an object with `async post(log, platform)` for a platform key"""
+    ADAPTERS[platform] = adapter
+
+
+def get_adapter(platform: str):
+    return ADAPTERS.get(platform, default_adapter)
+
+
+# -----------------
+# Metrics
+# -----------------
+
+class DispatchMetrics:
+    def __init__(self, window: int = 1000):
+        self.started = time.monotonic()
+        self.jobs_posted = 0
+        self.jobs_failed = 0
+        self.platform_posts = 0
+        self.platform_failures = 0
+        self.retries = 0
+        self.queue_depth = None
+        self._latencies = deque(maxlen=window)  # seconds from created_at to completion
+
+    def record_job(self, posted: bool, latency: float):
+        if posted:
+            self.jobs_posted += 1
+        else:
+            self.jobs_failed += 1
+        self._latencies.append(latency)
+
+    def snapshot(self) -> dict:
+        elapsed = time.monotonic() - self.started
+        jobs = self.jobs_posted + self.jobs_failed
+        latencies = sorted(self._latencies)
+
+        def pct(p):
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 3) if latencies else None
+
+        return {
+            "jobs_posted": self.jobs_posted,
+            "jobs_failed": self.jobs_failed,
+            "jobs_per_s": round(jobs / elapsed, 2) if elapsed else 0.0,
+            "platform_posts": self.platform_posts,
+            "platform_failures": self.platform_failures,
+            "retries": self.retries,
+            "queue_depth": self.queue_depth,
+            "latency_p50_s": pct(0.50),
+            "latency_p95_s": pct(0.95),
+        }
+
+
+# -----------------
+# Worker
+# -----------------
+
+class UploadWorker:
+    def __init__(self, db, jobs: int = 8, per_platform: int = 4, max_attempts: int = 3,
+                 backoff_base: float = 0.5, lease_seconds: float = 300, poll_interval: float = 1.0,
+                 post_timeout: float = 30):
+        self.db = db
+        self.jobs = jobs
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.lease_seconds = lease_seconds
+        # Every attempt at a platform must fit inside one lease, or a hung adapter
+        # outlives the claim and the log is re-claimed and posted twice
+        self.post_timeout = min(post_timeout, lease_seconds / (2 * max_attempts))
+        self.poll_interval = poll_interval
+        self.metrics = DispatchMetrics()
+        self._platform_slots = defaultdict(lambda: asyncio.Semaphore(per_platform))
+        self._stopping = asyncio.Event()
+
+    async def claim(self) -> Optional[dict]:
+        """Atomically move the oldest queued log (or one with an expired lease) to processing"""
+        now = datetime.now(timezone.utc)
+        return await self.db["uploadlog"].find_one_and_update(
+            {"$or": [
+                {"status": "queued"},
+                {"status": "processing", "lease_until": {"$lt": now}},
+            ]},
+            {
+                "$set": {"status": "processing", "claimed_at": now, "lease_until": now + timedelta(seconds=self.lease_seconds)},
+                "$inc": {"attempts": 1},
+            },
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    @staticmethod
+    def _lease_filter(log: dict) -> dict:
+        return {"_id": log["_id"], "status": "processing", "claimed_at": log["claimed_at"]}
+
+    async def _post(self, log: dict, platform: str) -> Optional[str]:
+        """Post to one platform with retries; returns an error message or None"""
+        adapter = get_adapter(platform)
+        error = None
+        for attempt in range(self.max_attempts):
+            if attempt:
+                self.metrics.retries += 1
+                await asyncio.sleep(self.backoff_base * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+            async with self._platform_slots[platform]:
+                try:
+                    await asyncio.wait_for(adapter.post(log, platform), self.post_timeout)
+                except asyncio.TimeoutError:
+                    error = f"timed out after {self.post_timeout:g}s"
+                    continue
+                except Exception as e:
+                    error = str(e) or type(e).__name__
+                    continue
+            self.metrics.platform_posts += 1
+            # Record each success right away so a re-claim does not post it again
+            await self.db["uploadlog"].update_one(self._lease_filter(log), {"$set": {f"results.{platform}": "posted"}})
+            return None
+        self.metrics.platform_failures += 1
+        return error
+
+    async def process(self, log: dict):
+        platforms = log.get("platforms", [])
+        done = {p for p, outcome in (log.get("results") or {}).items() if outcome == "posted"}
+        pending = [p for p in platforms if p not in done]
+        errors = await asyncio.gather(*(self._post(log, p) for p in pending))
+        failed = {p: e for p, e in zip(pending, errors) if e}
+        await self._finish(log, failed)
+
+    async def _finish(self, log: dict, failed: dict):
+        platforms = log.get("platforms", [])
+        now = datetime.now(timezone.utc)
+        result = await self.db["uploadlog"].update_one(
+            self._lease_filter(log),
+            {
+                "$set": {
+                    "status": "failed" if failed else "posted",
+                    "error": "; ".join(f"{p}: {e}" for p, e in failed.items()) or None,
+                    "results": {p: ("failed" if p in failed else "posted") for p in platforms},
+                    "completed_at": now,
+                    "updated_at": now,
+                },
+                "$unset": {"lease_until": ""},
+            },
+        )
+        if result.matched_count == 0:
+            logger.warning("Lease on uploadlog %s was lost; result discarded", log["_id"])
+            return
+        created_at = log.get("created_at")
+        latency = (now - as_utc(created_at)).total_seconds() if created_at else 0.0
+        self.metrics.record_job(not failed, latency)
+
+    async def _sleep(self, seconds: float):
+        """Sleep, waking early on stop()"""
+        try:
+            await asyncio.wait_for(self._stopping.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _loop(self):
+        failures = 0
+        while not self._stopping.is_set():
+            try:
+                log = await self.claim()
+                failures = 0
+            except PyMongoError:
+                # Transient (e.g. AutoReconnect during a failover): back off and keep going
+                logger.exception("Failed to claim an uploadlog")
+                failures += 1
+                await self._sleep(min(self.backoff_base * 2 ** failures, 30.0))
+                continue
+            if log is None:
+                await self._sleep(self.poll_interval)
+                continue
+            try:
+                if log.get("attempts", 0) > self.max_attempts:
+                    # Keeps crashing or timing out; stop re-claiming it
+                    await self._finish(log, {p: "gave up after repeated attempts" for p in log.get("platforms", [])
+                                             if (log.get("results") or {}).get(p) != "posted"})
+                else:
+                    await self.process(log)
+            except Exception:
+                # Leave it in processing; the lease expires and another pass retries it
+                logger.exception("Failed to process uploadlog %s", log["_id"])
+
+    async def _report(self, interval: float):
+        while not self._stopping.is_set():
+            try:
+                self.metrics.queue_depth = await self.db["uploadlog"].count_documents({"status": "queued"})
+            except PyMongoError:
+                logger.exception("Failed to read the upload queue depth")
+            logger.info("dispatch metrics %s", self.metrics.snapshot())
+            await self._sleep(interval)
+
+    async def run(self, metrics_interval: float = 10.0):
+        """Run `jobs` claim/process loops until stop() is called"""
+        await asyncio.gather(self._report(metrics_interval), *(self._loop() for _ in range(self.jobs)))
+
+    def stop(self):
+        self._stopping.set()
+
+
+async def main(args):
+    if database.async_db is None:
+        raise SystemExit("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+    worker = UploadWorker(
+        database.async_db,
+        jobs=args.jobs,
+        per_platform=args.per_platform,
+        max_attempts=args.max_attempts,
+        backoff_base=args.backoff,
+        post_timeout=args.post_timeout,
+    )
+    try:
+        await worker.run(metrics_interval=args.metrics_interval)
+    finally:
+        logger.info("final dispatch metrics %s", worker.metrics.snapshot())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dispatch queued uploads to their platforms")
+    parser.add_argument("--jobs", type=int, default=int(os.getenv("WORKER_JOBS", 8)), help="uploads processed concurrently")
+    parser.add_argument("--per-platform", type=int, default=int(os.getenv("WORKER_PER_PLATFORM", 4)), help="concurrent posts per platform")
+    parser.add_argument("--max-attempts", type=int, default=3)
+    parser.add_argument("--backoff", type=float, default=0.5, help="base retry backoff in seconds")
+    parser.add_argument("--post-timeout", type=float, default=float(os.getenv("WORKER_POST_TIMEOUT", 30)), help="seconds before a platform post counts as a failed attempt")
+    parser.add_argument("--metrics-interval", type=float, default=10.0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    try:
+        asyncio.run(main(args))
+    except KeyboardInterrupt:
+        pass